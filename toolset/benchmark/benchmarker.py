@@ -1,16 +1,17 @@
-from toolset.utils.output_helper import log, FNULL
+from toolset.utils.output_helper import log
 from toolset.utils.docker_helper import DockerHelper
 from toolset.utils.time_logger import TimeLogger
 from toolset.utils.metadata import Metadata
 from toolset.utils.results import Results
 from toolset.utils.audit import Audit
+from toolset.utils.sampler import Sampler
+from toolset.utils.scheduler import Scheduler
+from toolset.utils.build_pipeline import BuildPipeline
 
 import os
-import subprocess
 import traceback
 import sys
 import time
-import shlex
 from pprint import pprint
 
 from colorama import Fore
@@ -31,6 +32,11 @@ class Benchmarker:
 
         self.results = Results(self)
         self.docker_helper = DockerHelper(self)
+        self.scheduler = Scheduler(
+            config, self.docker_helper.server.info()
+            if config.concurrency > 1 or config.build_cores
+            or config.cpu_counts != [None] else None)
+        self.pipeline = None
 
     ##########################################################################################
     # Public methods
@@ -52,24 +58,44 @@ class Benchmarker:
 
         # build hyperfine needed for current run
         self.docker_helper.build_hyperfine()
+        if self.config.profile:
+            self.docker_helper.build_profiler()
 
         with open(os.path.join(self.results.directory, 'benchmark.log'),
                   'w') as benchmark_log:
-            for test in self.tests:
-                log("Running Test: %s" % test.name, border='-')
-                with self.config.quiet_out.enable():
-                    if not self.__run_test(test, benchmark_log):
-                        any_failed = True
-                # Load intermediate result from child process
-                self.results.load()
+            if self.scheduler.slots:
+                any_failed = not self.__run_concurrently(benchmark_log)
+            else:
+                for test in self.tests:
+                    # Scaling sweeps run every corpus size for each generator
+                    for (file_number, file_size, storage,
+                         cpus) in self.config.run_points():
+                        self.config.file_number = file_number
+                        self.config.file_size = file_size
+                        self.config.storage = storage
+                        self.config.cpus = cpus
+                        log("Running Test: %s (%s files of %s KB%s%s)" %
+                            (test.name, file_number, file_size,
+                             ', %s storage' % storage if storage else '',
+                             ', %d cpus' % cpus if cpus else ''),
+                            border='-')
+                        with self.config.quiet_out.enable():
+                            if not self.__run_test(test, benchmark_log):
+                                any_failed = True
+                        # Load intermediate result from child process
+                        self.results.load()
 
         # Parse results
         if self.config.mode == "benchmark":
             log("Parsing Results ...", border='=')
             self.results.parse(self.tests)
 
+        # Flag regressions against earlier runs and check the budget
+        if self.results.check_history():
+            any_failed = True
+
         self.results.set_completion_time()
-        self.results.upload()
+        self.results.upload(final=True)
         self.results.finish()
 
         return any_failed
@@ -92,6 +118,50 @@ class Benchmarker:
         self.time_logger.log_test_end(log_prefix=prefix, file=file)
         return success
 
+    def __run_concurrently(self, benchmark_log):
+        """
+        Runs the tests in the scheduler's slots. The slots step through the
+        corpus sizes, storage profiles and cpu counts together, so that they
+        all share the current ones.
+        Returns True if every test succeeded.
+        """
+        succeeded = True
+        for (file_number, file_size, storage,
+             cpus) in self.config.run_points():
+            self.config.file_number = file_number
+            self.config.file_size = file_size
+            self.config.storage = storage
+            self.config.cpus = cpus
+
+            def run_test(test):
+                log("Running Test: %s (%s files of %s KB%s%s) in slot %d" %
+                    (test.name, file_number, file_size,
+                     ', %s storage' % storage if storage else '',
+                     ', %d cpus' % cpus if cpus else '',
+                     test.slot['index']),
+                    border='-')
+                return self.__run_test(test, benchmark_log)
+
+            # Upcoming images are built on the reserved cores meanwhile
+            if self.scheduler.reserved:
+                self.pipeline = BuildPipeline(
+                    self, [
+                        t for t in self.tests if not self.config.exclude
+                        or t.name not in self.config.exclude
+                    ], self.scheduler.reserved, len(self.scheduler.slots))
+                self.pipeline.start()
+
+            # Slot threads would swap stdout under each other's feet
+            with self.config.quiet_out.enable():
+                if not all(self.scheduler.run(self.tests, run_test)):
+                    succeeded = False
+            self.results.load()
+
+            if self.pipeline is not None:
+                self.pipeline.stop()
+                self.pipeline = None
+        return succeeded
+
     def __run_test(self, test, benchmark_log):
         """
         Runs the given test, verifies that the webapp is accepting requests,
@@ -115,8 +185,9 @@ class Benchmarker:
                 file=benchmark_log)
 
         try:
-            # Start webapp
-            container = test.start()
+            # Start webapp, with the image the pipeline built if there is one
+            container = test.start(
+                self.pipeline.take(test) if self.pipeline else None)
             self.time_logger.mark_test_starting()
             if container is None:
                 self.docker_helper.stop([container])
@@ -129,11 +200,23 @@ class Benchmarker:
                     prefix=log_prefix,
                     file=benchmark_log)
 
-            max_time = time.time() + 60
-            while True:
-                if time.time() >= max_time or not self.docker_helper.server_container_exists(container.id):
-                    break
-                time.sleep(1)
+            if test.name not in self.results.versions:
+                self.results.report_version(test, test.get_version())
+
+            readiness = getattr(test, 'readiness', None)
+            time_to_ready = self.docker_helper.wait_until_ready(
+                container, readiness)
+            self.results.report_readiness(test, time_to_ready)
+            if time_to_ready is None:
+                log("Server did not get ready, benchmarking anyway",
+                    prefix=log_prefix,
+                    file=benchmark_log,
+                    color=Fore.YELLOW)
+            else:
+                log("Time to ready: %.2f s" % time_to_ready,
+                    prefix=log_prefix,
+                    file=benchmark_log,
+                    color=Fore.YELLOW)
 
             # Debug mode blocks execution here until ctrl+c
             if self.config.mode == "debug":
@@ -150,8 +233,10 @@ class Benchmarker:
             #passed_verify = test.verify_urls()
             #self.audit.audit_test_dir(test.directory)
 
-            # Benchmark this test
-            if self.config.mode == "benchmark":
+            # Benchmark this test, verify mode only does so to check the
+            # performance budget
+            if self.config.mode == "benchmark" or \
+                    self.config.budget is not None:
                 log("Benchmarking %s" % test.name,
                     file=benchmark_log,
                     border='-')
@@ -213,15 +298,18 @@ class Benchmarker:
 
             if not test.failed:
                 # Begin resource usage metrics collection
-                self.__begin_logging(generator_test, test_type)
-
-                script = self.config.types[test_type].get_script_name()
-                script_variables = self.config.types[test_type].get_script_variables(test.name)
+                sampler = self.__begin_logging(generator_test, test_type)
 
-                self.docker_helper.benchmark(script, script_variables, raw_file)
+                test.benchmark(self, generator_test, raw_file)
 
                 # End resource usage metrics collection
-                self.__end_logging()
+                self.__end_logging(generator_test, sampler)
+
+                if self.config.profile:
+                    test.profile(
+                        self, generator_test,
+                        self.results.get_test_type_dir(
+                            generator_test.name, test_type))
 
             results = self.results.parse_test(generator_test, test_type)
             log("Benchmark results:", file=benchmark_log)
@@ -237,23 +325,21 @@ class Benchmarker:
 
     def __begin_logging(self, generator_test, test_type):
         """
-        Starts a thread to monitor the resource usage, to be synced with the
-        client's time.
+        Starts a thread to monitor the resource usage of the host and of
+        the containers the builds of the test run in, to be synced with the
+        client's time. The docker helper points it at every such container
+        it starts (see DockerHelper.follow). Returns the running Sampler.
         """
-        output_file = "{file_name}".format(
-            file_name=self.results.get_stats_file(generator_test.name,
-                                                  test_type))
-        dstat_string = "dstat -Tafilmprs --aio --fs --ipc --lock --raw --socket --tcp \
-                                      --raw --socket --tcp --udp --unix --vm --disk-util \
-                                      --rpc --rpcd --output {output_file}".format(
-            output_file=output_file)
-        cmd = shlex.split(dstat_string)
-        self.subprocess_handle = subprocess.Popen(
-            cmd, stdout=FNULL, stderr=subprocess.STDOUT)
-
-    def __end_logging(self):
+        sampler = Sampler(
+            self.results.get_stats_file(generator_test.name, test_type),
+            interval=self.config.stats_interval / 1000.0)
+        generator_test.sampler = sampler
+        sampler.start()
+        return sampler
+
+    def __end_logging(self, generator_test, sampler):
         """
         Stops the logger thread and blocks until shutdown is complete.
         """
-        self.subprocess_handle.terminate()
-        self.subprocess_handle.communicate()
+        generator_test.sampler = None
+        sampler.stop()
@@ -21,6 +21,11 @@ class GeneratorTest:
         self.notes = ""
         self.port = ""
         self.versus = ""
+        # Set by the Scheduler while the test runs concurrently
+        self.slot = None
+        # Set by the Benchmarker while the test is benchmarked, see
+        # DockerHelper.follow
+        self.sampler = None
 
         self.__dict__.update(args)
 
@@ -28,25 +33,65 @@ class GeneratorTest:
     # Public Methods
     ##########################################################################################
 
-    def start(self):
+    def build(self, cpuset=None):
         """
-        Start the test implementation
+        Writes the content corpus and builds the test image, on the given
+        cpuset if any. Returns 0 on success.
         """
-        test_log_dir = os.path.join(self.benchmarker.results.directory, self.name.lower())
-        build_log_dir = os.path.join(test_log_dir, 'build')
-        run_log_dir = os.path.join(test_log_dir, 'run')
-
+        build_log_dir = os.path.join(self.benchmarker.results.directory,
+                                     self.name.lower(), 'build')
         try:
             os.makedirs(build_log_dir)
         except OSError:
             pass
+
+        # The corpus has to be on disk before the build copies `src`. The
+        # build, incremental and watch types share theirs, which is written
+        # once for the current corpus point.
+        written = set()
+        for test_type in self.runTests.values():
+            content_dir = test_type.get_content_dir(self.directory)
+            if content_dir is not None:
+                if content_dir in written:
+                    continue
+                written.add(content_dir)
+            test_type.create_files(self.directory)
+
+        return self.benchmarker.docker_helper.build(self, build_log_dir,
+                                                    cpuset)
+
+    def start(self, build_result=None):
+        """
+        Start the test implementation. build_result is the outcome of a
+        build() that already happened, otherwise the image is built first.
+        """
+        test_log_dir = os.path.join(self.benchmarker.results.directory, self.name.lower())
+        run_log_dir = os.path.join(test_log_dir, 'run')
+
         try:
             os.makedirs(run_log_dir)
         except OSError:
             pass
 
-        result = self.benchmarker.docker_helper.build(self, build_log_dir)
-        if result != 0:
+        if build_result is None:
+            build_result = self.build()
+        if build_result != 0:
             return None
 
         return self.benchmarker.docker_helper.run(self, run_log_dir)
+
+    def get_version(self):
+        """
+        Returns the version of the generator in the test image: the first
+        line its optional `version_command` prints, run in a fresh container
+        of the image. None without the key or if the command fails.
+        """
+        command = getattr(self, 'version_command', None)
+        if not command:
+            return None
+        exit_code, output, _, _ = self.benchmarker.docker_helper.run_once(
+            self, command)
+        lines = [line.strip() for line in output.splitlines() if line.strip()]
+        if exit_code != 0 or not lines:
+            return None
+        return lines[0]
@@ -1,3 +1,5 @@
 
 from generator_test_type import *
 from build_type import BuildTestType
+from incremental_type import IncrementalTestType
+from watch_type import WatchTestType
@@ -1,16 +1,27 @@
 import os
-import random
-import string
-from subprocess import call
+import json
+import time
 from toolset.benchmark.test_types.generator_test_type import GeneratorTestType
+from toolset.utils import corpus
+from toolset.utils import cgroup
+from toolset.utils import memory_search
+from toolset.utils import profiler
+from toolset.utils.corpus_cache import CorpusCache
+from toolset.utils.output_helper import log
 
 class BuildTestType(GeneratorTestType):
 
+    # Timed builds per scenario with --build-execution exec or --cache-mode
+    RUNS = 5
+
+    # Untimed builds that fill the page cache with --cache-mode warm
+    WARMUP = 3
+
     def __init__(self, config):
 
         kwargs = {
             'name': 'build',
-            'args': ['file_number', 'file_size']
+            'args': ['content_url', 'content_header', 'build_command']
         }
 
         GeneratorTestType.__init__(self, config, **kwargs)
@@ -18,15 +29,218 @@ class BuildTestType(GeneratorTestType):
     def verify(self, base_url):
         pass
 
-    #def create_files (self):
-    #    counter = 0
-    #    for x in range(0, self.config.file_number):
-    #        building_file = open("src/" + self.config.content_url + "".join(str(counter) + "".join([random.choice(string.digits) for counter in range(16)]) + ".md"), "wb")
-    #        building_file.write(self.config.content_header)
-    #        building_file.write(os.urandom(self.config.file_size))
-    #        building_file.close()
-    #    call(["docker run -it -d matheusrv/ssgberk.test.jekyll:latest /bin/bash"])
-    #    call(["docker exec -it matheusrv/ssgberk.test.jekyll:latest echo 'Hello from container!'"])
+    def get_content_dir(self, directory):
+        """
+        Returns the directory the generator reads its posts from, relative to
+        the `src` folder of the given test directory.
+        """
+        return os.path.join(directory, 'src', self.content_url.strip('/'))
+
+    def create_files(self, directory):
+        """
+        Writes the synthetic content corpus for this run into the test's
+        `content_url`, prefixing every post with its `content_header`.
+        Unless the cache is disabled the posts are hardlinked from the
+        shared corpus cache instead of being generated again.
+        """
+        if self.config.corpus_cache_quota:
+            return CorpusCache(self.config).link(
+                self.get_content_dir(directory), self.content_header)
+
+        return corpus.generate(
+            self.get_content_dir(directory),
+            self.config.file_number,
+            self.config.file_size,
+            header=self.content_header,
+            seed=self.config.seed,
+            profile=self.config.corpus_profile)
+
+    def benchmark(self, benchmarker, generator_test, raw_file):
+        """
+        Times the build with hyperfine, or in the generator image as JSON
+        results to raw_file:
+
+        With --build-execution exec, first in a fresh container per build
+        (cold-container, container and runtime start-up included), then
+        repeatedly in one long-lived container after an untimed warm-up
+        build (warm-container).
+
+        With --cache-mode, in one long-lived container per mode: cold-cache
+        drops the page cache of the server before every build, warm-cache
+        runs WARMUP untimed builds first so that the corpus and the
+        runtime's files are cached.
+
+        With --memory-search, the smallest memory limit the build succeeds
+        with (memory-search), see __search_memory.
+        """
+        if self.config.build_execution != 'exec' and \
+                not self.config.cache_modes and \
+                not self.config.memory_search:
+            return GeneratorTestType.benchmark(self, benchmarker,
+                                               generator_test, raw_file)
+
+        docker_helper = benchmarker.docker_helper
+        with open(raw_file, 'w') as raw:
+            if self.config.build_execution == 'exec':
+                times = []
+                usages = []
+                windows = []
+                for run in range(self.RUNS):
+                    start = time.time()
+                    exit_code, output, elapsed, usage = \
+                        docker_helper.run_once(generator_test,
+                                               self.build_command)
+                    if exit_code != 0:
+                        log(output, prefix="%s: " % generator_test.name)
+                        break
+                    times.append(elapsed)
+                    usages.append(usage)
+                    windows.append([start, start + elapsed])
+                self.__write(raw, 'cold-container', times, usages, windows,
+                             exit_code)
+                self.__benchmark_container(docker_helper, generator_test,
+                                           raw, 'warm-container', 1)
+
+            for mode in self.config.cache_modes:
+                if mode == 'cold':
+                    self.__benchmark_container(
+                        docker_helper, generator_test, raw, 'cold-cache', 0,
+                        lambda: docker_helper.drop_caches(generator_test))
+                else:
+                    self.__benchmark_container(docker_helper,
+                                               generator_test, raw,
+                                               'warm-cache', self.WARMUP)
+
+            if self.config.memory_search:
+                self.__search_memory(docker_helper, generator_test, raw)
+
+    def profile(self, benchmarker, generator_test, directory):
+        """
+        Runs the build once more, untimed, in a fresh container under the
+        sampling profiler of the generator's language (see
+        toolset/utils/profiler.py), and writes its collapsed stacks and
+        flame graph to directory/profile, next to the raw profiler output.
+        """
+        docker_helper = benchmarker.docker_helper
+        prefix = "%s: " % generator_test.name
+        name = profiler.choose(generator_test)
+        target = os.path.join(directory, 'profile')
+        container = docker_helper.run_idle(generator_test, profilers=True)
+        try:
+            exit_code, output, elapsed = docker_helper.execute(
+                container, profiler.command(name, self.build_command))
+            if exit_code != 0:
+                log(output, prefix=prefix)
+                log("Profiling the build with %s failed" % name,
+                    prefix=prefix)
+                return
+            docker_helper.copy_from(container, profiler.OUTPUT, target)
+        finally:
+            docker_helper.stop([container])
+        counts = profiler.collect(
+            os.path.join(target, os.path.basename(profiler.OUTPUT)))
+        profiler.write(counts, target,
+                       "%s build (%s)" % (generator_test.name, name))
+        log("Profile: %d samples with %s in %.2f s, see %s" %
+            (sum(counts.values()), name, elapsed, target),
+            prefix=prefix)
+
+    def __search_memory(self, docker_helper, generator_test, raw):
+        """
+        Binary-searches the smallest memory limit a fresh container of the
+        test image builds the site with, down to --memory-precision, then
+        times the build at multiples of it. Every build is one point of the
+        time-vs-memory curve, OOM kills are told apart from other failures
+        by the container state.
+        """
+        prefix = "%s: " % generator_test.name
+
+        def probe(memory):
+            exit_code, oom_killed, output, elapsed, _ = \
+                docker_helper.run_limited(generator_test, self.build_command,
+                                          memory)
+            outcome = 'oom' if oom_killed else \
+                'ok' if exit_code == 0 else 'failed'
+            log("%d MB: %s%s" % (memory // memory_search.MEGABYTE, outcome,
+                                 ' in %.2f s' % elapsed
+                                 if outcome == 'ok' else ''),
+                prefix=prefix)
+            return outcome, elapsed
+
+        upper = docker_helper.memory_limit(generator_test)
+        minimum, curve = memory_search.search(
+            probe, upper,
+            self.config.memory_precision * memory_search.MEGABYTE)
+        if minimum is not None:
+            measured = set(point['memory'] for point in curve)
+            for factor in memory_search.CURVE_FACTORS:
+                memory = int(minimum * factor)
+                if memory < upper and memory not in measured:
+                    outcome, elapsed = probe(memory)
+                    curve.append({
+                        'memory': memory,
+                        'time': elapsed if outcome == 'ok' else None,
+                        'outcome': outcome
+                    })
+            log("Minimum memory: %d MB" % (minimum // memory_search.MEGABYTE),
+                prefix=prefix)
+        raw.write(json.dumps({
+            'scenario': 'memory-search',
+            'command': self.build_command,
+            'minimumMemory': minimum,
+            'upperMemory': upper,
+            'curve': curve,
+            'failed': minimum is None
+        }) + '\n')
+
+    def __benchmark_container(self, docker_helper, generator_test, raw,
+                              scenario, warmup, prepare=None):
+        """
+        Times RUNS builds in a long-lived container of the test image after
+        warmup untimed ones, calling prepare before every timed build.
+        """
+        container = docker_helper.run_idle(generator_test)
+        try:
+            times = []
+            usages = []
+            windows = []
+            exit_code = 0
+            for run in range(warmup):
+                exit_code, output, _ = docker_helper.execute(
+                    container, self.build_command)
+                if exit_code != 0:
+                    break
+            for run in range(self.RUNS if exit_code == 0 else 0):
+                if prepare is not None:
+                    prepare()
+                start = time.time()
+                exit_code, output, elapsed, usage = \
+                    docker_helper.execute_accounted(container,
+                                                    self.build_command)
+                if exit_code != 0:
+                    break
+                times.append(elapsed)
+                usages.append(usage)
+                windows.append([start, start + elapsed])
+            if exit_code != 0:
+                log(output, prefix="%s: " % generator_test.name)
+            self.__write(raw, scenario, times, usages, windows, exit_code)
+        finally:
+            docker_helper.stop([container])
+
+    def __write(self, raw, scenario, times, usages, windows, exit_code):
+        """
+        Writes the result of a scenario to raw, with the start and end time
+        of every timed run so that the stats can be split per run
+        """
+        raw.write(json.dumps({
+            'scenario': scenario,
+            'command': self.build_command,
+            'times': times,
+            'usage': usages,
+            'windows': windows,
+            'failed': exit_code != 0
+        }) + '\n')
 
     def get_script_name(self):
         return 'build.sh'
@@ -35,16 +249,16 @@ class BuildTestType(GeneratorTestType):
         return {
             'name':
             name,
-			'port':
-			self.config.port,
-			'content_url':
-			self.config.content_url,
+            'content_url':
+            self.content_url,
             'file_number':
             self.config.file_number,
             'file_size':
             self.config.file_size,
             'header':
-            self.config.content_header,
+            self.content_header,
             'build_command':
-            self.config.build_command
+            self.build_command,
+            'cgroup_snapshot':
+            cgroup.SNAPSHOT
         }
@@ -43,6 +43,37 @@ class GeneratorTestType:
     def verify(self, base_url):
         raise NotImplementedError("Subclasses must provide verify")
 
+    def get_content_dir(self, directory):
+        """
+        Returns the directory create_files writes into, None if it writes
+        nothing. Test types sharing one write it only once.
+        """
+        return None
+
+    def create_files(self, directory):
+        """
+        Writes any content this test type needs into the test directory
+        before the docker image is built. Returns the number of files written.
+        """
+        return 0
+
+    def benchmark(self, benchmarker, generator_test, raw_file):
+        """
+        Runs the benchmark of this test type for the given GeneratorTest and
+        writes its output to raw_file. By default the remote script runs on
+        the hyperfine container.
+        """
+        benchmarker.docker_helper.benchmark(
+            self.get_script_name(), self.get_script_variables(self.name),
+            raw_file, generator_test.slot, generator_test)
+
+    def profile(self, benchmarker, generator_test, directory):
+        """
+        Profiles the generator with --profile and writes the profile to
+        directory. Test types without a command to profile do nothing.
+        """
+        pass
+
     def get_script_name(self):
         """
         Returns the remote script name for running the benchmarking process.
@@ -0,0 +1,145 @@
+import json
+import time
+from toolset.benchmark.test_types.build_type import BuildTestType
+from toolset.utils import corpus
+from toolset.utils.output_helper import log
+
+class IncrementalTestType(BuildTestType):
+    """
+    Builds the site once, then changes a few posts and times the rebuild
+    with the generator's incremental build command (`incremental_command`
+    in benchmark_config.json, falling back to `build_command`).
+    """
+
+    # Edit scenarios, in the order they are run
+    SCENARIOS = ['touch', 'edit', 'add', 'delete']
+
+    # Timed rebuilds per scenario
+    RUNS = 5
+
+    def __init__(self, config):
+        BuildTestType.__init__(self, config)
+        self.name = 'incremental'
+
+    def parse(self, test_keys):
+        BuildTestType.parse(self, test_keys)
+        self.incremental_command = test_keys.get('incremental_command',
+                                                 self.build_command)
+        return self
+
+    def profile(self, benchmarker, generator_test, directory):
+        """
+        The full build is profiled once, by the build test type
+        """
+        pass
+
+    def benchmark(self, benchmarker, generator_test, raw_file):
+        """
+        Runs every scenario in a long-lived container of the test image and
+        writes one JSON result per scenario to raw_file.
+        """
+        docker_helper = benchmarker.docker_helper
+        container = docker_helper.run_idle(generator_test)
+        try:
+            with open(raw_file, 'w') as raw:
+                start = time.time()
+                exit_code, output, elapsed, usage = \
+                    docker_helper.execute_accounted(
+                        container, self.incremental_command)
+                self.__write(raw, 'initial', [elapsed], [usage],
+                             [[start, start + elapsed]], exit_code)
+                if exit_code != 0:
+                    log(output, prefix="%s: " % generator_test.name)
+                    return
+
+                for scenario in self.SCENARIOS:
+                    if scenario == 'delete' and not self.__can_delete():
+                        log("Skipping the delete scenario: %d runs of %d "
+                            "deletions need more than the %d posts of the "
+                            "corpus" % (self.RUNS, self.__files(),
+                                        self.config.file_number),
+                            prefix="%s: " % generator_test.name)
+                        continue
+                    times = []
+                    usages = []
+                    windows = []
+                    for run in range(self.RUNS):
+                        exit_code, output, _ = docker_helper.execute(
+                            container, self.__get_edit_command(scenario, run))
+                        if exit_code != 0:
+                            log("The %s edit of run %d failed" %
+                                (scenario, run),
+                                prefix="%s: " % generator_test.name)
+                            log(output, prefix="%s: " % generator_test.name)
+                            break
+                        start = time.time()
+                        exit_code, output, elapsed, usage = \
+                            docker_helper.execute_accounted(
+                                container, self.incremental_command)
+                        if exit_code != 0:
+                            log(output, prefix="%s: " % generator_test.name)
+                            break
+                        times.append(elapsed)
+                        usages.append(usage)
+                        windows.append([start, start + elapsed])
+                    self.__write(raw, scenario, times, usages, windows,
+                                 exit_code)
+        finally:
+            docker_helper.stop([container])
+
+    def __files(self):
+        """
+        Returns the number of posts every run changes: `incremental_files`,
+        at most the whole corpus
+        """
+        return min(self.config.incremental_files, self.config.file_number)
+
+    def __can_delete(self):
+        """
+        Returns whether every run of the delete scenario has posts of its
+        own to remove, besides the first ones the other scenarios change
+        """
+        count = self.__files()
+        return count > 0 and \
+            self.config.file_number - count >= self.RUNS * count
+
+    def __get_edit_command(self, scenario, run):
+        """
+        Returns the shell command that applies the scenario to
+        `incremental_files` posts of the corpus for the given run.
+        """
+        content_dir = self.content_url.strip('/')
+        count = self.__files()
+        number = self.config.file_number
+
+        def posts(indexes):
+            return ' '.join('%s/%s' % (content_dir, corpus.post_file_name(i))
+                            for i in indexes)
+
+        if scenario == 'touch':
+            return 'touch %s' % posts(range(count))
+        if scenario == 'edit':
+            return ' && '.join('echo "Edited in run %d." >> %s' % (run, post)
+                               for post in posts(range(count)).split())
+        if scenario == 'add':
+            # New posts are copies of the first posts under fresh indexes
+            first = number + run * count
+            return ' && '.join(
+                'cp %s %s' % (source, target) for source, target in zip(
+                    posts(range(count)).split(),
+                    posts(range(first, first + count)).split()))
+        # delete: every run removes posts from the end of the corpus, see
+        # __can_delete
+        last = number - run * count
+        return 'rm %s' % posts(range(last - count, last))
+
+    def __write(self, raw, scenario, times, usages, windows, exit_code):
+        raw.write(json.dumps({
+            'scenario': scenario,
+            'files': self.__files(),
+            'command': self.incremental_command,
+            'times': times,
+            'usage': usages,
+            'windows': windows,
+            'failed': exit_code != 0
+        }) + '\n')
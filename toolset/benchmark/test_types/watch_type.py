@@ -0,0 +1,118 @@
+import json
+import time
+from toolset.benchmark.test_types.build_type import BuildTestType
+from toolset.utils import corpus
+from toolset.utils.output_helper import log
+
+class WatchTestType(BuildTestType):
+    """
+    Starts the generator's watch or serve process (`watch_command` in
+    benchmark_config.json), then edits the first post over and over and
+    times how long it takes until the change shows up in its page,
+    `watch_page` in `output_dir`. Dev servers that only render in memory
+    can declare a `watch_url` instead, which is then polled over HTTP.
+    """
+
+    # Timed edits, enough for the 99th percentile to mean something
+    RUNS = 100
+
+    # Polling interval and give-up time of the in-container wait loops
+    POLL_INTERVAL = 0.01
+    TIMEOUT = 300
+
+    def __init__(self, config):
+        BuildTestType.__init__(self, config)
+        self.name = 'watch'
+        self.args = self.args + ['watch_command', 'output_dir']
+
+    def parse(self, test_keys):
+        BuildTestType.parse(self, test_keys)
+        self.watch_url = test_keys.get('watch_url')
+        self.watch_page = test_keys.get('watch_page')
+        return self
+
+    def profile(self, benchmarker, generator_test, directory):
+        """
+        The full build is profiled once, by the build test type
+        """
+        pass
+
+    def benchmark(self, benchmarker, generator_test, raw_file):
+        """
+        Writes the time to first serve and the edit-to-output latencies as
+        JSON results to raw_file.
+        """
+        docker_helper = benchmarker.docker_helper
+        output_dir = self.output_dir.strip('/')
+        post = '%s/%s' % (self.content_url.strip('/'),
+                          corpus.post_file_name(0))
+        if not self.watch_url and not self.watch_page:
+            log("Needs a `watch_page` or a `watch_url` to watch",
+                prefix="%s: " % generator_test.name)
+            with open(raw_file, 'w') as raw:
+                self.__write(raw, 'first-serve', [], [], 1)
+            return
+        page = '%s/%s' % (output_dir, self.watch_page.strip('/')) \
+            if self.watch_page else None
+
+        container = docker_helper.run_idle(generator_test)
+        try:
+            with open(raw_file, 'w') as raw:
+                docker_helper.execute(container, 'rm -rf %s' % output_dir)
+                docker_helper.execute(
+                    container, self.watch_command, detach=True)
+                if self.watch_url:
+                    served = 'wget -q -O /dev/null %s' % self.watch_url
+                else:
+                    served = '[ -f %s/index.html ]' % output_dir
+                start = time.time()
+                exit_code, output, elapsed = docker_helper.execute(
+                    container, self.__wait_until(served))
+                self.__write(raw, 'first-serve', [elapsed],
+                             [[start, start + elapsed]], exit_code)
+                if exit_code != 0:
+                    log("Watch process never served the site",
+                        prefix="%s: " % generator_test.name)
+                    return
+
+                times = []
+                windows = []
+                for run in range(self.RUNS):
+                    marker = 'ssgberk-watch-%d.' % run
+                    if self.watch_url:
+                        changed = 'wget -q -O - %s | grep -qF "%s"' % (
+                            self.watch_url, marker)
+                    else:
+                        changed = 'grep -qF "%s" %s 2>/dev/null' % (marker,
+                                                                   page)
+                    start = time.time()
+                    exit_code, output, elapsed = docker_helper.execute(
+                        container, 'echo "%s" >> %s && %s' %
+                        (marker, post, self.__wait_until(changed)))
+                    if exit_code != 0:
+                        log("Edit %d never reached the output" % run,
+                            prefix="%s: " % generator_test.name)
+                        break
+                    times.append(elapsed)
+                    windows.append([start, start + elapsed])
+                self.__write(raw, 'edit', times, windows, exit_code)
+        finally:
+            docker_helper.stop([container])
+
+    def __wait_until(self, condition):
+        """
+        Returns a shell loop that polls condition until it holds, failing
+        once TIMEOUT seconds have passed.
+        """
+        return ('deadline=$(($(date +%%s) + %d)); until %s; do '
+                '[ $(date +%%s) -ge $deadline ] && exit 1; sleep %s; done') % (
+                    self.TIMEOUT, condition, self.POLL_INTERVAL)
+
+    def __write(self, raw, scenario, times, windows, exit_code):
+        raw.write(json.dumps({
+            'scenario': scenario,
+            'command': self.watch_command,
+            'times': times,
+            'windows': windows,
+            'failed': exit_code != 0
+        }) + '\n')
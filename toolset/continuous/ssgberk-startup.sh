@@ -31,14 +31,5 @@ do
     --results-upload-uri "$SSGBERK_UPLOAD_URI" \
     --quiet
 
-  zip -r results.zip results
-
-  curl \
-    -i -v \
-    -X POST \
-    --header "Content-Type: application/zip" \
-    --data-binary @results.zip \
-    $SSGBERK_UPLOAD_URI
-
   sleep 5
 done
@@ -1,10 +1,26 @@
-#!/bin/bash
+#!/bin/sh
 
-hyperfine --min-runs 5 $build_command
+# Runs in a container of the generator image, with this directory mounted
+# from the hyperfine image, see DockerHelper.benchmark
+hyperfine="$(dirname "$0")/hyperfine"
 
-echo $build_command
+# Defines the cgroup snapshot functions, see toolset/utils/cgroup.py
+printf '%s\n' "$cgroup_snapshot" > /tmp/cgroup.sh
+. /tmp/cgroup.sh
 
+# Every untimed --prepare ends the previous run with a snapshot, and begins
+# the next one, so the snapshots bracket each timed run. Failed builds are
+# recorded by their exit codes in the export rather than aborting it.
+: > /tmp/cgroup-snapshots
+"$hyperfine" --min-runs 5 --style basic --ignore-failure \
+  --export-json /tmp/hyperfine.json \
+  --prepare ". /tmp/cgroup.sh; ssgberk_cgroup_snapshot >> /tmp/cgroup-snapshots; ssgberk_cgroup_reset_peak" \
+  "$build_command"
 
-sleep 1000
+ssgberk_cgroup_snapshot >> /tmp/cgroup-snapshots
+cat /tmp/cgroup-snapshots
 
-done
+# Per-iteration times, see toolset/utils/hyperfine.py
+echo "ssgberk-hyperfine-json"
+cat /tmp/hyperfine.json
+echo "ssgberk-hyperfine-json"
@@ -0,0 +1,35 @@
+#!/bin/sh
+# Usage: bundle.sh <directory> <binary> <name> [<binary> <name> ...]
+#
+# Copies every binary to <directory>/bin/<name> so that it runs in any
+# image, whatever its libc. Static binaries are copied as they are. A
+# dynamic binary gets its libraries and the dynamic loader copied to
+# <directory>/lib, and <name> becomes a script that starts the binary with
+# that loader. Processes the binary starts run with their own libraries.
+set -e
+
+directory=$1
+shift
+mkdir -p "$directory/bin" "$directory/lib"
+
+while [ $# -gt 1 ]; do
+  binary=$1
+  name=$2
+  shift 2
+  if ! ldd "$binary" > /dev/null 2>&1; then
+    cp "$binary" "$directory/bin/$name"
+    chmod 755 "$directory/bin/$name"
+    continue
+  fi
+  cp "$binary" "$directory/lib/$name.bin"
+  ldd "$binary" | awk '$2 == "=>" && $3 ~ /^\// {print $3} $1 ~ /^\// {print $1}' |
+    while read library; do
+      cp -L "$library" "$directory/lib/"
+    done
+  loader=$(ldd "$binary" | awk '$1 ~ /^\// {print $1}' | head -n 1)
+  cat > "$directory/bin/$name" <<SCRIPT
+#!/bin/sh
+exec $directory/lib/${loader##*/} --library-path $directory/lib $directory/lib/$name.bin "\$@"
+SCRIPT
+  chmod 755 "$directory/bin/$name"
+done
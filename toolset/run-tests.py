@@ -110,6 +110,17 @@ def main(argv=None):
         help=
         'Parses the results of the given timestamp and merges that with the latest results'
     )
+    parser.add_argument(
+        '--compare',
+        default=None,
+        help='Compares the results with those of the given timestamp, instead of the noise band of earlier runs'
+    )
+    parser.add_argument(
+        '--budget',
+        default=None,
+        type=float,
+        help='Performance budget: fails verify mode when a generator regressed by more than this many percent'
+    )
 
     # Test options
     parser.add_argument(
@@ -128,7 +139,7 @@ def main(argv=None):
         '--exclude', default=None, nargs='+', help='names of tests to exclude')
     parser.add_argument(
         '--type',
-        choices=['all', 'build'],
+        choices=['all', 'build', 'incremental', 'watch'],
         default='all',
         help='which type of test to run')
     parser.add_argument(
@@ -141,12 +152,34 @@ def main(argv=None):
     )
     parser.add_argument(
         '--file-size',
-        default=10,
-        help='Content file size to beanchmark')
+        default=[10],
+        action=StoreSeqAction,
+        help='Content file size (in KB) to benchmark (type int-sequence), every size is combined with every --file-number')
     parser.add_argument(
         '--file-number',
-        default=1000,
-        help='Number of content files to beanchmark')
+        default=[1000],
+        action=StoreSeqAction,
+        help='Number of content files to benchmark (type int-sequence)')
+    parser.add_argument(
+        '--seed',
+        default=0,
+        type=int,
+        help='Seed for the synthetic content corpus, the same seed always produces the same files')
+    parser.add_argument(
+        '--corpus-profile',
+        choices=['uniform', 'mixed'],
+        default='uniform',
+        help='uniform gives every content file the same size, mixed spreads sizes around --file-size')
+    parser.add_argument(
+        '--corpus-cache-quota',
+        default=10240,
+        type=int,
+        help='Disk quota (in MB) of the corpus cache in the results directory, 0 disables the cache')
+    parser.add_argument(
+        '--incremental-files',
+        default=1,
+        type=int,
+        help='Number of content files touched, edited, added or deleted before each incremental rebuild')
     parser.add_argument(
         '--list-tests',
         action='store_true',
@@ -165,6 +198,78 @@ def main(argv=None):
     parser.add_argument(
         '--client-host', default='', help='Hostname/IP for client server')
 
+    parser.add_argument(
+        '--stats-interval',
+        default=50,
+        type=int,
+        help='Interval in milliseconds between two resource usage samples')
+    parser.add_argument(
+        '--build-execution',
+        choices=['hyperfine', 'exec'],
+        default='hyperfine',
+        help='hyperfine times builds from the hyperfine container, exec runs them in the generator image and reports fresh-container (cold) and long-lived-container (warm) times separately')
+    parser.add_argument(
+        '--cache-mode',
+        choices=['cold', 'warm', 'both'],
+        default=None,
+        help='Times builds in the generator image with the page cache dropped before every build (cold), after warm-up builds (warm) or both, to tell I/O-bound from CPU-bound generators')
+    parser.add_argument(
+        '--storage',
+        nargs='+',
+        choices=['overlay', 'tmpfs', 'bind', 'throttled'],
+        default=None,
+        help='Storage profiles to benchmark every generator on: the container overlay (docker\'s default), tmpfs, a bind-mounted host directory or a throttled one; the content and output directories are moved onto the storage. Needs --build-execution exec, --cache-mode or --memory-search')
+    parser.add_argument(
+        '--throttle-rate',
+        default=20,
+        type=int,
+        help='Read and write rate (in MB/s) of the throttled storage profile')
+    parser.add_argument(
+        '--throttle-iops',
+        default=200,
+        type=int,
+        help='Read and write operations per second of the throttled storage profile')
+    parser.add_argument(
+        '--cpu-counts',
+        default=None,
+        action=StoreSeqAction,
+        help='Reruns every test with its containers limited to each number of cpus (type int-sequence, e.g. 1,2,4,8) and reports speedup, parallel efficiency and the serial fraction')
+    parser.add_argument(
+        '--memory-search',
+        action='store_true',
+        default=False,
+        help='Binary-searches the smallest memory limit every generator builds the site with and records its build time against memory')
+    parser.add_argument(
+        '--memory-precision',
+        default=16,
+        type=int,
+        help='Precision (in MB) of the --memory-search')
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        default=False,
+        help='Profiles one more build of every generator with the sampling profiler of its language (py-spy, rbspy, node --cpu-prof or perf) and stores its collapsed stacks and flame graph in the results')
+    parser.add_argument(
+        '--concurrency',
+        default=1,
+        type=int,
+        help='Number of tests to run at once, each on its own set of physical cores')
+    parser.add_argument(
+        '--slot-memory',
+        default=0,
+        type=int,
+        help='Memory limit (in MB) of every concurrent test, 0 splits the server memory evenly')
+    parser.add_argument(
+        '--build-cores',
+        default=0,
+        type=int,
+        help='Physical cores reserved for building the images of upcoming tests while the current ones are benchmarked, 0 builds each image right before its test')
+    parser.add_argument(
+        '--force-rebuild',
+        action='store_true',
+        default=False,
+        help='Rebuild every image and pull its base image, even when an image of the same build context exists')
+
     # Network options
     parser.add_argument(
         '--network-mode',
@@ -173,6 +278,13 @@ def main(argv=None):
 
     args = parser.parse_args()
 
+    # Hyperfine builds run in the client container, which has no storage
+    if args.storage and args.build_execution != 'exec' and \
+            not args.cache_mode and not args.memory_search:
+        parser.error('--storage needs --build-execution exec, --cache-mode '
+                     'or --memory-search, hyperfine builds do not run on '
+                     'the storage profiles')
+
     config = BenchmarkConfig(args)
     benchmarker = Benchmarker(config)
 
@@ -200,9 +312,10 @@ def main(argv=None):
             all_tests = benchmarker.metadata.gather_tests()
 
             for test in all_tests:
-                test.parse_all()
+                benchmarker.results.parse_all(test)
 
             benchmarker.results.parse(all_tests)
+            benchmarker.results.check_history()
 
         else:
             any_failed = benchmarker.run()
@@ -0,0 +1,53 @@
+import os
+import unittest
+
+from toolset.utils import cgroup
+from toolset.utils import hyperfine
+
+EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                      'hyperfine-export.json')
+
+
+class ParseTest(unittest.TestCase):
+    """
+    Parses the raw output of toolset/hyperfine/build.sh around an export of
+    hyperfine 1.11, the way Results.parse_test does
+    """
+
+    def raw(self, export):
+        return ''.join([
+            'Benchmark #1: hugo\n', cgroup.SNAPSHOT_MARKER, '\n',
+            'uptime 100.00\nusage_usec 1000\n', cgroup.SNAPSHOT_MARKER,
+            '\n', hyperfine.EXPORT_MARKER, '\n', export, '\n',
+            hyperfine.EXPORT_MARKER, '\n'
+        ])
+
+    def parse(self, export):
+        output, snapshots = cgroup.parse(self.raw(export))
+        self.assertEqual(1, len(snapshots))
+        return hyperfine.parse(output)
+
+    def test_export(self):
+        with open(EXPORT) as f:
+            results = self.parse(f.read())
+        self.assertEqual(1, len(results))
+        result = results[0]
+        self.assertEqual('hugo', result['command'])
+        self.assertEqual(5, len(result['times']))
+        self.assertAlmostEqual(1.2516227192, result['median'])
+        self.assertAlmostEqual(2.9174354, result['userMean'])
+        self.assertEqual([0] * 5, result['exitCodes'])
+        self.assertFalse(result['failed'])
+
+    def test_failed_run(self):
+        with open(EXPORT) as f:
+            export = f.read().replace('0,\n        0,\n        0,\n',
+                                      '0,\n        1,\n        0,\n', 1)
+        self.assertTrue(self.parse(export)[0]['failed'])
+
+    def test_no_export(self):
+        self.assertEqual([], hyperfine.parse('Command terminated\n'))
+
+
+if __name__ == '__main__':
+    unittest.main()
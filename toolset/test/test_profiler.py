@@ -0,0 +1,50 @@
+import os
+import unittest
+
+from toolset.utils import profiler
+from toolset.utils.metadata import Metadata
+
+LANG_ROOT = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__)))), 'generators')
+
+
+class Config:
+    def __init__(self, test_dir):
+        self.lang_root = LANG_ROOT
+        self.test_lang = None
+        self.test_dir = [test_dir]
+        self.types = dict()
+
+
+class Benchmarker:
+    def __init__(self, test_dir):
+        self.config = Config(test_dir)
+
+
+class ChooseTest(unittest.TestCase):
+    """
+    Runs real benchmark_config.json files through Metadata, which lowercases
+    the language, and checks the profiler chosen for each
+    """
+
+    def choose(self, test_dir):
+        tests = Metadata(Benchmarker(test_dir)).gather_tests()
+        self.assertTrue(tests)
+        return [profiler.choose(test) for test in tests]
+
+    def test_python(self):
+        self.assertEqual(['py-spy'], self.choose('Python/nikola'))
+
+    def test_ruby(self):
+        self.assertEqual(['rbspy'], self.choose('Ruby/jekyll'))
+
+    def test_javascript(self):
+        self.assertEqual(['node'], self.choose('JavaScript/gatsby'))
+
+    def test_default(self):
+        self.assertEqual(['perf'], self.choose('Go/hugo'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,269 @@
+import math
+import random
+import itertools
+
+# Coverage of the bootstrap confidence intervals
+CONFIDENCE = 0.95
+
+# Resamples drawn per bootstrap
+BOOTSTRAP_RESAMPLES = 2000
+
+# Family-wise error rate of the pairwise tests of one corpus size
+SIGNIFICANCE = 0.05
+
+# Samples whose modified z-score exceeds this are outliers (Iglewicz and
+# Hoaglin)
+OUTLIER_SCORE = 3.5
+
+# Scales the MAD to the standard deviation of normally distributed samples
+MAD_SCALE = 1.4826
+
+# Largest n1 * n2 for which Mann-Whitney p-values are computed exactly
+EXACT_LIMIT = 2500
+
+
+def percentile(values, q):
+    """
+    Returns the q-th percentile (0 <= q <= 100) of sorted values,
+    interpolating linearly between the closest ranks.
+    """
+    position = (len(values) - 1) * q / 100.0
+    lower = int(math.floor(position))
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def median(values):
+    """
+    Returns the median of sorted values.
+    """
+    return percentile(values, 50)
+
+
+def mad(values, center=None):
+    """
+    Returns the median absolute deviation of sorted values.
+    """
+    if center is None:
+        center = median(values)
+    return median(sorted(abs(v - center) for v in values))
+
+
+def outliers(values):
+    """
+    Returns the indexes of the outliers in values by their modified z-score,
+    which unlike the standard score is not dragged along by the outliers.
+    """
+    ordered = sorted(values)
+    center = median(ordered)
+    spread = mad(ordered, center) * MAD_SCALE
+    if spread == 0:
+        return []
+    return [i for i, v in enumerate(values)
+            if abs(v - center) / spread > OUTLIER_SCORE]
+
+
+def bootstrap(values, rng, statistic=median, resamples=BOOTSTRAP_RESAMPLES,
+              confidence=CONFIDENCE):
+    """
+    Returns the percentile bootstrap confidence interval of statistic over
+    values as [low, high]. Every resample is drawn as one list of random
+    indexes into values.
+    """
+    size = len(values)
+    draw = rng.random
+    estimates = sorted(
+        statistic(sorted([values[int(draw() * size)] for _ in values]))
+        for _ in range(resamples))
+    tail = (1 - confidence) / 2 * 100
+    return [percentile(estimates, tail), percentile(estimates, 100 - tail)]
+
+
+def ranks(values):
+    """
+    Returns the ranks of values, starting at 1, with ties given their mean
+    rank, and the tie correction sum of (t^3 - t) over every tie group.
+    """
+    order = sorted(range(len(values)), key=values.__getitem__)
+    result = [0.0] * len(values)
+    correction = 0.0
+    start = 0
+    while start < len(order):
+        end = start
+        while end + 1 < len(order) and \
+                values[order[end + 1]] == values[order[start]]:
+            end += 1
+        for i in order[start:end + 1]:
+            result[i] = (start + end) / 2.0 + 1
+        ties = end - start + 1
+        correction += ties ** 3 - ties
+        start = end + 1
+    return result, correction
+
+
+def u_distribution(n1, n2):
+    """
+    Returns the number of arrangements of two samples of sizes n1 and n2
+    without ties for every value of the Mann-Whitney U statistic.
+    """
+    # counts[j][u] holds the arrangements of i and j samples with U = u,
+    # built up one i at a time
+    counts = [[1] for _ in range(n2 + 1)]
+    for i in range(1, n1 + 1):
+        row = [[1]]
+        for j in range(1, n2 + 1):
+            left, below = counts[j], row[j - 1]
+            size = i * j + 1
+            row.append([(left[u - j] if 0 <= u - j < len(left) else 0) +
+                        (below[u] if u < len(below) else 0)
+                        for u in range(size)])
+        counts = row
+    return counts[n2]
+
+
+def mann_whitney(a, b):
+    """
+    Runs the two-sided Mann-Whitney U test of samples a and b. Returns U of
+    a, the p-value and Cliff's delta, which is negative when a tends to be
+    smaller than b. The p-value is exact for small samples without ties and
+    otherwise uses the tie-corrected normal approximation.
+    """
+    n1, n2 = len(a), len(b)
+    rank, correction = ranks(list(a) + list(b))
+    u = sum(rank[:n1]) - n1 * (n1 + 1) / 2.0
+    delta = 2.0 * u / (n1 * n2) - 1
+
+    if correction == 0 and n1 * n2 <= EXACT_LIMIT:
+        counts = u_distribution(n1, n2)
+        extreme = int(round(min(u, n1 * n2 - u)))
+        p = 2.0 * sum(counts[:extreme + 1]) / sum(counts)
+        return u, min(1.0, p), delta
+
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - correction / (n * (n - 1)))
+    if variance <= 0:
+        return u, 1.0, delta
+    z = (abs(u - n1 * n2 / 2.0) - 0.5) / math.sqrt(variance)
+    return u, min(1.0, math.erfc(max(z, 0) / math.sqrt(2))), delta
+
+
+def holm(p_values):
+    """
+    Returns the Holm-Bonferroni adjusted p-values of a family of tests.
+    """
+    order = sorted(range(len(p_values)), key=p_values.__getitem__)
+    adjusted = [0.0] * len(p_values)
+    running = 0.0
+    for position, i in enumerate(order):
+        running = max(running, (len(p_values) - position) * p_values[i])
+        adjusted[i] = min(1.0, running)
+    return adjusted
+
+
+def describe(times, rng):
+    """
+    Returns the summary statistics of one generator's per-iteration times.
+    """
+    ordered = sorted(times)
+    center = median(ordered)
+    return {
+        'samples': len(times),
+        'mean': math.fsum(times) / len(times),
+        'median': center,
+        'mad': mad(ordered, center),
+        'min': ordered[0],
+        'max': ordered[-1],
+        'p95': percentile(ordered, 95),
+        'p99': percentile(ordered, 99),
+        'medianConfidenceInterval': bootstrap(times, rng),
+        'outliers': outliers(times)
+    }
+
+
+def compare(samples):
+    """
+    Runs the pairwise Mann-Whitney U tests between all generators of one
+    corpus size, with Holm-Bonferroni adjusted p-values.
+    """
+    comparisons = []
+    for a, b in itertools.combinations(sorted(samples), 2):
+        u, p, delta = mann_whitney(samples[a], samples[b])
+        median_a = median(sorted(samples[a]))
+        median_b = median(sorted(samples[b]))
+        comparisons.append({
+            'a': a,
+            'b': b,
+            'u': u,
+            'pValue': p,
+            'cliffsDelta': delta,
+            'medianRatio': median_b / median_a if median_a else None,
+            'faster': a if delta < 0 else b if delta > 0 else None
+        })
+    for comparison, adjusted in zip(
+            comparisons, holm([c['pValue'] for c in comparisons])):
+        comparison['pAdjusted'] = adjusted
+        comparison['significant'] = adjusted < SIGNIFICANCE
+    return comparisons
+
+
+def series(test_type, result, cpus=True):
+    """
+    Returns the key the times of a result are reported under: the test
+    type, `test_type:scenario` for test types with several scenarios,
+    `@storage` appended when the run compared storage profiles and
+    `/<n>cpu` when it limited the cpus, unless cpus is False.
+    """
+    key = test_type
+    if 'scenario' in result:
+        key = '%s:%s' % (key, result['scenario'])
+    if result.get('storage'):
+        key = '%s@%s' % (key, result['storage'])
+    if cpus and result.get('cpus'):
+        key = '%s/%dcpu' % (key, result['cpus'])
+    return key
+
+
+def group(raw_data):
+    """
+    Collects the per-iteration times of the successful results in
+    results.json rawData as {key: {(file_number, file_size): {generator:
+    times}}}, keyed by series().
+    """
+    groups = dict()
+    for test_type, generators in raw_data.items():
+        if not isinstance(generators, dict):
+            continue
+        for name, results in generators.items():
+            if not isinstance(results, list):
+                continue
+            for r in results:
+                if not isinstance(r, dict) or not r.get('times') or \
+                        r.get('failed'):
+                    continue
+                key = series(test_type, r)
+                point = (r.get('fileNumber'), r.get('fileSize'))
+                groups.setdefault(key, dict()).setdefault(
+                    point, dict()).setdefault(name, []).extend(r['times'])
+    return groups
+
+
+def analyze(raw_data, seed=0):
+    """
+    Returns the statistics of results.json rawData per test type (or
+    `test_type:scenario`) and corpus size: a summary per generator, the
+    pairwise significance tests and the ranking by median time. Bootstrap
+    resampling is seeded, so equal data gives equal intervals.
+    """
+    rng = random.Random(seed)
+    analysis = dict()
+    for key, points in sorted(group(raw_data).items()):
+        for point, samples in sorted(points.items()):
+            summaries = dict((name, describe(times, rng))
+                             for name, times in sorted(samples.items()))
+            analysis.setdefault(key, dict())['%s-%skb' % point] = {
+                'generators': summaries,
+                'comparisons': compare(samples),
+                'ranking': sorted(summaries,
+                                  key=lambda n: summaries[n]['median'])
+            }
+    return analysis
@@ -3,6 +3,7 @@ from toolset.utils.output_helper import QuietOutputStream
 
 import os
 import time
+import itertools
 
 
 class BenchmarkConfig:
@@ -14,6 +15,8 @@ class BenchmarkConfig:
         # Map type strings to their objects
         types = dict()
         types['build'] = BuildTestType(self)
+        types['incremental'] = IncrementalTestType(self)
+        types['watch'] = WatchTestType(self)
 
         # Turn type into a map instead of a string
         if args.type == 'all':
@@ -22,6 +25,7 @@ class BenchmarkConfig:
             self.types = {args.type: types[args.type]}
 
         self.duration = args.duration
+        self.stats_interval = args.stats_interval
         self.exclude = args.exclude
         self.quiet = args.quiet
         self.server_host = args.server_host
@@ -35,11 +39,40 @@ class BenchmarkConfig:
         self.results_environment = args.results_environment
         self.results_name = args.results_name
         self.results_upload_uri = args.results_upload_uri
+        self.compare = args.compare
+        self.budget = args.budget
         self.test = args.test
         self.test_dir = args.test_dir
         self.test_lang = args.test_lang
-        self.file_size = args.file_number
-        self.file_number = args.file_number
+        self.file_sizes = args.file_size
+        self.file_numbers = args.file_number
+        # The corpus of the current test, Benchmarker.run steps through
+        # every combination of the sizes above
+        self.file_size = self.file_sizes[0]
+        self.file_number = self.file_numbers[0]
+        self.seed = args.seed
+        self.corpus_profile = args.corpus_profile
+        self.corpus_cache_quota = args.corpus_cache_quota
+        self.incremental_files = args.incremental_files
+        self.build_execution = args.build_execution
+        self.cache_modes = ['cold', 'warm'] if args.cache_mode == 'both' \
+            else [args.cache_mode] if args.cache_mode else []
+        # Without --storage, results carry no storage profile at all
+        self.storage_profiles = args.storage or [None]
+        self.storage = None
+        self.throttle_rate = args.throttle_rate
+        self.throttle_iops = args.throttle_iops
+        # Without --cpu-counts, containers get every cpu of their slot
+        self.cpu_counts = sorted(args.cpu_counts) if args.cpu_counts \
+            else [None]
+        self.cpus = None
+        self.memory_search = args.memory_search
+        self.memory_precision = args.memory_precision
+        self.profile = args.profile
+        self.concurrency = args.concurrency
+        self.slot_memory = args.slot_memory
+        self.build_cores = args.build_cores
+        self.force_rebuild = args.force_rebuild
         self.network_mode = args.network_mode
         self.server_docker_host = None
         self.client_docker_host = None
@@ -66,6 +99,7 @@ class BenchmarkConfig:
         self.lang_root = os.path.join(self.fw_root, "generators")
         self.results_root = os.path.join(self.fw_root, "results")
         self.hyperfine_root = os.path.join(self.fw_root, "toolset", "hyperfine")
+        self.profiler_root = os.path.join(self.fw_root, "toolset", "profiler")
         self.scaffold_root = os.path.join(self.fw_root, "toolset", "scaffolding")
 
         if hasattr(self, 'parse') and self.parse is not None:
@@ -74,3 +108,20 @@ class BenchmarkConfig:
             self.timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
 
         self.run_test_timeout_seconds = 7200
+
+    def corpus_points(self):
+        """
+        Returns every (file_number, file_size) combination of this run.
+        """
+        return list(itertools.product(self.file_numbers, self.file_sizes))
+
+    def run_points(self):
+        """
+        Returns every (file_number, file_size, storage, cpus) combination of
+        this run, storage is None without --storage and cpus without
+        --cpu-counts.
+        """
+        return [(file_number, file_size, storage, cpus)
+                for (file_number, file_size) in self.corpus_points()
+                for storage in self.storage_profiles
+                for cpus in self.cpu_counts]
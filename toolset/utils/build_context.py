@@ -0,0 +1,238 @@
+import os
+import re
+import json
+import stat
+import time
+import tarfile
+import hashlib
+from io import BytesIO
+
+# Image label holding the digest of the build context an image was built from
+DIGEST_LABEL = 'ssgberk.context-digest'
+
+# Bumped whenever the digest changes meaning, so old labels never match
+DIGEST_VERSION = '2'
+
+# Bytes read from a context file at a time while streaming it to the daemon
+CHUNK_SIZE = 64 * 1024
+
+
+def ignore_patterns(path):
+    """
+    Returns the patterns of the .dockerignore in path as (pattern, exclude)
+    pairs, in file order. Patterns starting with `!` re-include files.
+    """
+    patterns = []
+    try:
+        with open(os.path.join(path, '.dockerignore')) as f:
+            lines = f.read().splitlines()
+    except IOError:
+        return patterns
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        include = line.startswith('!')
+        line = os.path.normpath(line.lstrip('!').strip().lstrip('/'))
+        patterns.append((translate(line), not include))
+    return patterns
+
+
+def translate(pattern):
+    """
+    Compiles a .dockerignore pattern the way Docker matches them: `*` and `?`
+    stay within one path segment, `**` spans any number of segments, and a
+    pattern matching a directory also matches everything below it.
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+            if pattern.startswith('/', i):
+                regex += '/?'
+                i += 1
+            continue
+        c = pattern[i]
+        if c == '*':
+            regex += '[^/]*'
+        elif c == '?':
+            regex += '[^/]'
+        elif c == '[':
+            end = pattern.find(']', i)
+            if end < 0:
+                regex += re.escape(c)
+            else:
+                regex += '[%s]' % pattern[i + 1:end].replace('\\', '\\\\')
+                i = end
+        else:
+            regex += re.escape(c)
+        i += 1
+    return re.compile('^%s(/.*)?$' % regex)
+
+
+def is_ignored(relative_path, patterns):
+    """
+    Returns True if the last pattern matching relative_path excludes it.
+    """
+    ignored = False
+    for regex, exclude in patterns:
+        if regex.match(relative_path):
+            ignored = exclude
+    return ignored
+
+
+def sources(path, dockerfile):
+    """
+    Returns the COPY and ADD sources of the dockerfile in path as compiled
+    patterns, or None if any of them cannot be resolved without running the
+    build (a variable in a source path), in which case the whole context is
+    needed. URLs and copies from other build stages are left out, and so are
+    ONBUILD instructions, which only run in the builds of child images.
+    """
+    with open(os.path.join(path, dockerfile)) as f:
+        text = re.sub(r'\\[ \t]*\r?\n', ' ', f.read())
+    patterns = []
+    for line in text.splitlines():
+        words = line.strip().split(None, 1)
+        if len(words) < 2 or words[0].upper() not in ('COPY', 'ADD'):
+            continue
+        arguments = words[1].strip()
+        if arguments.startswith('['):
+            try:
+                arguments = json.loads(arguments)
+            except ValueError:
+                return None
+        else:
+            arguments = arguments.split()
+        flags = [a for a in arguments if a.startswith('--')]
+        arguments = [a for a in arguments if not a.startswith('--')]
+        if any(flag.startswith('--from') for flag in flags):
+            continue
+        for source in arguments[:-1]:
+            if re.match(r'^[a-z][a-z0-9+.-]*://', source, re.I):
+                continue
+            if '$' in source:
+                return None
+            source = os.path.normpath(source.lstrip('/'))
+            # The whole context
+            if source == '.':
+                source = '**'
+            patterns.append(translate(source))
+    return patterns
+
+
+def files(path, dockerfile):
+    """
+    Returns the paths, relative to path, of the files the dockerfile in path
+    needs in its build context, sorted: the files its COPY and ADD
+    instructions refer to, less those excluded by the .dockerignore. The
+    Dockerfile and the .dockerignore are always part of it.
+    """
+    needed = sources(path, dockerfile)
+    patterns = ignore_patterns(path)
+    always = set([dockerfile, '.dockerignore'])
+    result = []
+    for root, directories, names in os.walk(path):
+        relative_root = os.path.relpath(root, path)
+        if relative_root == '.':
+            relative_root = ''
+        for name in names:
+            relative = os.path.join(relative_root, name)
+            if relative in always:
+                result.append(relative)
+            elif not is_ignored(relative, patterns) and (
+                    needed is None or
+                    any(regex.match(relative) for regex in needed)):
+                result.append(relative)
+        # Excluded directories may still hold re-included files, so only
+        # prune them when no pattern re-includes anything
+        if all(exclude for _, exclude in patterns):
+            directories[:] = [
+                d for d in directories
+                if not is_ignored(os.path.join(relative_root, d), patterns)
+            ]
+    return sorted(result)
+
+
+def digest(path, dockerfile, *extra):
+    """
+    Returns the sha256 of the build context in path: the name, executable
+    bit and contents of every file (or the target of every symlink) the
+    daemon would receive, plus any extra build parameters.
+    """
+    sha = hashlib.sha256(DIGEST_VERSION.encode('utf-8'))
+    for part in (dockerfile, ) + extra:
+        sha.update(('%s\0' % (part, )).encode('utf-8'))
+    for relative in files(path, dockerfile):
+        full = os.path.join(path, relative)
+        sha.update(relative.encode('utf-8') + b'\0')
+        info = os.lstat(full)
+        if stat.S_ISLNK(info.st_mode):
+            sha.update(b'l' + os.readlink(full).encode('utf-8') + b'\0')
+            continue
+        sha.update(b'x' if info.st_mode & stat.S_IXUSR else b'f')
+        with open(full, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        sha.update(b'\0')
+    return sha.hexdigest()
+
+
+class ContextStream(object):
+    """
+    The build context of a dockerfile as an uncompressed tar, generated file
+    by file while the daemon reads it (pass it as the `fileobj` of a
+    `custom_context` build). At most CHUNK_SIZE bytes of a file are held in
+    memory at once. Records the size of the context and how long sending it
+    took.
+    """
+
+    def __init__(self, path, dockerfile):
+        self.path = path
+        self.names = files(path, dockerfile)
+        self.size = 0
+        self.started = None
+        self.finished = None
+
+    def __iter__(self):
+        self.started = time.time()
+        # Only used to describe files, the entries are written below
+        describer = tarfile.TarFile(fileobj=BytesIO(), mode='w')
+        for name in self.names:
+            full = os.path.join(self.path, name)
+            info = describer.gettarinfo(full, arcname=name)
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            yield self.__count(info.tobuf(tarfile.GNU_FORMAT))
+            if not info.isreg():
+                continue
+            with open(full, 'rb') as f:
+                remaining = info.size
+                while remaining:
+                    # A file that shrank meanwhile is padded, a file that
+                    # grew is cut, as the header has promised info.size
+                    block = f.read(min(CHUNK_SIZE, remaining)) or \
+                        tarfile.NUL * min(CHUNK_SIZE, remaining)
+                    remaining -= len(block)
+                    yield self.__count(block)
+            if info.size % tarfile.BLOCKSIZE:
+                yield self.__count(tarfile.NUL * (
+                    tarfile.BLOCKSIZE - info.size % tarfile.BLOCKSIZE))
+        yield self.__count(tarfile.NUL * (2 * tarfile.BLOCKSIZE))
+        self.finished = time.time()
+
+    def upload_time(self):
+        """
+        Seconds from the first byte to the last byte taken by the daemon, or
+        None if the stream was not read to the end.
+        """
+        if self.finished is None:
+            return None
+        return self.finished - self.started
+
+    def __count(self, data):
+        self.size += len(data)
+        return data
+
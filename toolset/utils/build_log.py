@@ -0,0 +1,171 @@
+import re
+import json
+import time
+import codecs
+
+from colorama import Fore, Style
+
+from toolset.utils.output_helper import log
+
+# Lines of build output written to the log at once
+BATCH_LINES = 200
+
+# Seconds buffered build output may wait before it is written anyway
+BATCH_INTERVAL = 0.5
+
+# "Step 3/12 : RUN npm install"
+STEP = re.compile(r'^Step (\d+)/(\d+) : ?(.*)$')
+
+
+class BuildError(Exception):
+    pass
+
+
+def _native(text):
+    """
+    Python 2 log files take UTF-8 bytes rather than unicode text
+    """
+    return text.encode('utf-8') if str is bytes else text
+
+
+class BuildLog(object):
+    """
+    Decodes the output stream of a docker build as it arrives and logs it.
+
+    The daemon sends JSON objects in HTTP chunks that need not line up with
+    them: a chunk may hold several objects, and an object or a multi-byte
+    character may be split across chunks. Every byte is scanned once, so
+    the cost stays linear in the size of the output however chatty the
+    build is. Lines are written in batches, and the start of every build
+    step is timed.
+    """
+
+    def __init__(self, prefix, file, batch_lines=BATCH_LINES,
+                 batch_interval=BATCH_INTERVAL):
+        self.prefix = prefix
+        self.file = file
+        self.batch_lines = batch_lines
+        self.batch_interval = batch_interval
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')('replace')
+        # Undecoded text after the last complete line of the stream, and
+        # the unfinished last line of the build output
+        self.pending = []
+        self.partial = []
+        self.batch = []
+        self.flushed = time.time()
+        self.steps = []
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def feed(self, chunk):
+        """
+        Decodes one chunk of the build stream. Raises a BuildError when the
+        daemon reports that the build failed.
+        """
+        if isinstance(chunk, bytes):
+            chunk = self.utf8.decode(chunk)
+        # Objects are separated by newlines, which JSON escapes inside
+        # strings, so only text up to the last newline can be decoded
+        end = chunk.rfind('\n')
+        if end < 0:
+            self.pending.append(chunk)
+            return
+        self.pending.append(chunk[:end])
+        text = ''.join(self.pending)
+        self.pending = [chunk[end + 1:]]
+        self.__decode(text)
+
+    def close(self):
+        """
+        Decodes and logs whatever is left of the stream and ends the timing
+        of the last step.
+        """
+        text = ''.join(self.pending) + self.utf8.decode(b'', True)
+        self.pending = []
+        self.__decode(text)
+        if self.partial:
+            self.__line(''.join(self.partial))
+            self.partial = []
+        self.__flush()
+        self.__end_step(time.time())
+
+    ##########################################################################################
+    # Private methods
+    ##########################################################################################
+
+    def __decode(self, text):
+        index = 0
+        length = len(text)
+        while index < length:
+            # Skip the whitespace between objects
+            while index < length and text[index] in ' \t\r\n':
+                index += 1
+            if index == length:
+                break
+            try:
+                token, index = self.decoder.raw_decode(text, index)
+            except ValueError:
+                # Not JSON, e.g. the plain text error of an early failure
+                end = text.find('\n', index)
+                end = length if end < 0 else end
+                self.__output(text[index:end] + '\n')
+                index = end
+                continue
+            if not isinstance(token, dict):
+                continue
+            if 'errorDetail' in token or 'error' in token:
+                self.__flush()
+                raise BuildError(
+                    (token.get('errorDetail') or {}).get('message') or
+                    token.get('error'))
+            if 'stream' in token:
+                self.__output(token['stream'])
+
+    def __output(self, text):
+        lines = text.split('\n')
+        if len(lines) == 1:
+            self.partial.append(text)
+            return
+        self.partial.append(lines[0])
+        self.__line(''.join(self.partial))
+        for line in lines[1:-1]:
+            self.__line(line)
+        self.partial = [lines[-1]] if lines[-1] else []
+
+    def __line(self, line):
+        step = STEP.match(line) if line.startswith('Step ') else None
+        if step is None:
+            self.batch.append(line)
+            if len(self.batch) >= self.batch_lines or \
+                    time.time() - self.flushed >= self.batch_interval:
+                self.__flush()
+            return
+        self.__flush()
+        now = time.time()
+        self.__end_step(now)
+        self.steps.append({
+            'step': int(step.group(1)),
+            'steps': int(step.group(2)),
+            'instruction': step.group(3),
+            'start': now,
+            'duration': None
+        })
+        log(_native(line),
+            prefix=self.prefix,
+            file=self.file,
+            color=Fore.WHITE + Style.BRIGHT)
+
+    def __end_step(self, now):
+        if self.steps and self.steps[-1]['duration'] is None:
+            self.steps[-1]['duration'] = now - self.steps[-1]['start']
+
+    def __flush(self):
+        if self.batch:
+            log(_native('\n'.join(self.batch)),
+                prefix=self.prefix,
+                file=self.file)
+            self.batch = []
+        self.flushed = time.time()
@@ -0,0 +1,76 @@
+import threading
+
+from colorama import Fore
+
+from toolset.utils.output_helper import log
+from toolset.utils import scheduler
+
+
+class BuildPipeline(threading.Thread):
+    """
+    Builds the images of upcoming tests in the background, on the cores the
+    Scheduler reserved for it, while earlier tests are benchmarked. The
+    toolset's share of the work, writing the corpus and hashing and
+    streaming the build context, runs on those cores too. It stays
+    at most `depth` builds ahead of the tests that took theirs, and a failed
+    build is reported as soon as it happens rather than when the test's turn
+    comes.
+    """
+
+    def __init__(self, benchmarker, tests, cpuset, depth=1):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.benchmarker = benchmarker
+        self.tests = list(tests)
+        self.cpuset = cpuset
+        self.ahead = threading.Semaphore(depth)
+        self.stopped = threading.Event()
+        self.builds = dict(
+            (test.name, [threading.Event(), None]) for test in self.tests)
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def run(self):
+        # Only this thread, and the corpus writers it forks, are pinned
+        scheduler.pin(scheduler.parse_cpuset(self.cpuset))
+        for test in self.tests:
+            self.ahead.acquire()
+            if self.stopped.is_set():
+                break
+            build = self.builds[test.name]
+            try:
+                build[1] = test.build(cpuset=self.cpuset)
+            except Exception as e:
+                log("Background build failed: %s" % e,
+                    prefix="%s: " % test.name,
+                    color=Fore.RED)
+                build[1] = 1
+            if build[1] != 0:
+                log("Image build failed, the test will be skipped",
+                    prefix="%s: " % test.name,
+                    color=Fore.RED)
+                self.benchmarker.results.write_intermediate(
+                    test.name, "ERROR: Problem building %s" % test.name)
+            build[0].set()
+        # Nothing waits for builds that were never started
+        for build in self.builds.values():
+            build[0].set()
+
+    def take(self, test):
+        """
+        Waits for the background build of test and returns its exit code,
+        0 on success, or None if the pipeline does not build it. Lets the
+        pipeline start one more build.
+        """
+        if test.name not in self.builds:
+            return None
+        self.ahead.release()
+        build = self.builds[test.name]
+        build[0].wait()
+        return build[1] if build[1] is not None else 1
+
+    def stop(self):
+        self.stopped.set()
+        self.ahead.release()
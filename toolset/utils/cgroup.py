@@ -0,0 +1,174 @@
+import re
+
+# Marks the counter snapshots in the output of a wrapped command
+SNAPSHOT_MARKER = 'ssgberk-cgroup-snapshot'
+
+# Prints the cumulative counters of the cgroup the shell runs in, which
+# inside a container is the container's own cgroup. Understands both cgroup
+# v1 and v2 and only needs a POSIX shell, cat and awk, which every generator
+# image has. cgroup v1 can reset its peak memory, so that the peak belongs to
+# the command that follows. Writing to the memory.peak of cgroup v2 only
+# resets the peak seen through that same open file, so there the peak is the
+# container's since it started (memory_lifetime_peak).
+SNAPSHOT = r'''
+ssgberk_cgroup_snapshot() {
+  cg=/sys/fs/cgroup
+  echo "@MARKER@"
+  awk '{print "uptime", $1}' /proc/uptime
+  if [ -f $cg/cgroup.controllers ]; then
+    awk '{print $1, $2}' $cg/cpu.stat
+    if [ -f $cg/memory.peak ]; then
+      echo "memory_lifetime_peak $(cat $cg/memory.peak)"
+    fi
+    awk '$1 == "pgfault" || $1 == "pgmajfault"' $cg/memory.stat
+    awk '{for (i = 2; i <= NF; i++) {split($i, kv, "="); io[kv[1]] += kv[2]}}
+      END {printf "io_read %d\nio_write %d\n", io["rbytes"], io["wbytes"]}' \
+      $cg/io.stat 2>/dev/null
+  else
+    awk '{printf "usage_usec %d\n", $1 / 1000}' $cg/cpuacct/cpuacct.usage \
+      2>/dev/null
+    awk '{print $1 "_ticks", $2}' $cg/cpuacct/cpuacct.stat
+    echo "memory_peak $(cat $cg/memory/memory.max_usage_in_bytes)"
+    awk '$1 == "total_pgfault" || $1 == "total_pgmajfault" {sub("total_", "", $1); print}' \
+      $cg/memory/memory.stat
+    awk '$2 == "Read" {r += $3} $2 == "Write" {w += $3}
+      END {printf "io_read %d\nio_write %d\n", r, w}' \
+      $cg/blkio/blkio.throttle.io_service_bytes 2>/dev/null
+  fi
+  echo "@MARKER@"
+}
+ssgberk_cgroup_reset_peak() {
+  echo 0 > /sys/fs/cgroup/memory/memory.max_usage_in_bytes 2>/dev/null
+  true
+}
+'''.replace('@MARKER@', SNAPSHOT_MARKER)
+
+# USER_HZ of the cgroup v1 cpuacct.stat ticks
+TICKS_PER_SECOND = 100.0
+
+
+def wrap(command):
+    """
+    Returns a shell script that runs command between two counter snapshots
+    and exits with the command's exit code.
+    """
+    return ('%s\nssgberk_cgroup_reset_peak\nssgberk_cgroup_snapshot\n'
+            '%s\nssgberk_status=$?\nssgberk_cgroup_snapshot\n'
+            'exit $ssgberk_status\n') % (SNAPSHOT, command)
+
+
+def parse(output):
+    """
+    Splits the output of a wrapped command into the command's own output and
+    the counters of every snapshot in it.
+    """
+    lines = []
+    snapshots = []
+    snapshot = None
+    for line in output.splitlines():
+        if line.strip() == SNAPSHOT_MARKER:
+            if snapshot is None:
+                snapshot = dict()
+            else:
+                snapshots.append(snapshot)
+                snapshot = None
+        elif snapshot is not None:
+            m = re.match(r'^(\S+)\s+([0-9.e+]+)$', line.strip())
+            if m:
+                snapshot[m.group(1)] = float(m.group(2))
+        else:
+            lines.append(line)
+    return '\n'.join(lines), snapshots
+
+
+def usage(before, after):
+    """
+    Returns the resources used between two snapshots.
+    """
+
+    def delta(key):
+        if key in before and key in after:
+            return after[key] - before[key]
+        return None
+
+    wall = delta('uptime')
+    user = delta('user_usec')
+    system = delta('system_usec')
+    if user is not None:
+        user, system = user / 1e6, system / 1e6
+    elif delta('user_ticks') is not None:
+        user = delta('user_ticks') / TICKS_PER_SECOND
+        system = delta('system_ticks') / TICKS_PER_SECOND
+    cpu = delta('usage_usec')
+    if cpu is not None:
+        cpu = cpu / 1e6
+    elif user is not None:
+        cpu = user + system
+
+    return {
+        'wallSeconds': wall,
+        'cpuSeconds': cpu,
+        'userSeconds': user,
+        'systemSeconds': system,
+        'parallelEfficiency': cpu / wall if cpu is not None and wall else None,
+        'memoryPeak': after.get('memory_peak'),
+        'containerMemoryPeak': after.get('memory_lifetime_peak'),
+        'ioReadBytes': delta('io_read'),
+        'ioWriteBytes': delta('io_write'),
+        'pageFaults': delta('pgfault'),
+        'majorPageFaults': delta('pgmajfault')
+    }
+
+
+def usages(snapshots):
+    """
+    Returns the usage of every (before, after) pair of snapshots.
+    """
+    return [usage(before, after)
+            for before, after in zip(snapshots[0::2], snapshots[1::2])]
+
+
+def chained_usages(snapshots):
+    """
+    Returns the usage between every snapshot and the next one, for runs
+    that follow each other with one snapshot in between.
+    """
+    return [usage(before, after)
+            for before, after in zip(snapshots[:-1], snapshots[1:])]
+
+
+def summarize(raw_data):
+    """
+    Returns the peak memory and the mean parallel efficiency (CPU seconds
+    per wall second) per test type and generator from results.json rawData.
+    memoryPeak is the peak of the builds themselves, where the kernel can
+    tell it (cgroup v1), containerMemoryPeak that of the containers they
+    ran in since each started (cgroup v2).
+    """
+    summary = dict()
+    for test_type, generators in raw_data.items():
+        if not isinstance(generators, dict):
+            continue
+        for name, results in generators.items():
+            if not isinstance(results, list):
+                continue
+            runs = []
+            for r in results:
+                if isinstance(r, dict):
+                    runs.extend(u for u in (r.get('usage') or []) if u)
+            peaks = [u['memoryPeak'] for u in runs if u.get('memoryPeak')]
+            container_peaks = [u['containerMemoryPeak'] for u in runs
+                               if u.get('containerMemoryPeak')]
+            efficiencies = [u['parallelEfficiency'] for u in runs
+                            if u.get('parallelEfficiency') is not None]
+            if not peaks and not container_peaks and not efficiencies:
+                continue
+            summary.setdefault(test_type, dict())[name] = {
+                'memoryPeak': max(peaks) if peaks else None,
+                'containerMemoryPeak':
+                max(container_peaks) if container_peaks else None,
+                'parallelEfficiency':
+                sum(efficiencies) / len(efficiencies) if efficiencies else None,
+                'runs': len(runs)
+            }
+    return summary
@@ -0,0 +1,149 @@
+import os
+import glob
+import random
+import datetime
+import multiprocessing
+
+from toolset.utils import scheduler
+
+# Every generated post carries this marker in its file name so that a corpus
+# can be told apart from the hand-written sample posts and removed again.
+POST_MARKER = 'ssgberk-post-'
+
+# Posts are spread over ten years starting here. Jekyll-style generators only
+# pick up posts whose file name starts with a YYYY-MM-DD date.
+FIRST_POST_DATE = datetime.date(2010, 1, 1)
+
+# Workload profiles: 'uniform' gives every post the requested size, 'mixed'
+# draws sizes from a log-normal distribution around it, like a real blog
+# with a few long articles among many short ones.
+PROFILES = ('uniform', 'mixed')
+
+# Corpora smaller than this are written in-process, the pool start-up
+# costs more than it saves.
+PARALLEL_THRESHOLD = 500
+
+WORDS = (
+    'static', 'site', 'generator', 'benchmark', 'build', 'page', 'post',
+    'template', 'layout', 'markdown', 'content', 'render', 'asset', 'theme',
+    'config', 'plugin', 'output', 'deploy', 'cache', 'index', 'archive',
+    'feed', 'tag', 'category', 'author', 'draft', 'publish', 'server',
+    'the', 'a', 'of', 'and', 'to', 'in', 'is', 'for', 'with', 'on', 'by',
+    'fast', 'slow', 'small', 'large', 'simple', 'modern', 'plain', 'clean')
+
+
+def post_file_name(index):
+    """
+    Returns the file name of the post with the given index.
+    """
+    day = FIRST_POST_DATE + datetime.timedelta(days=index % 3650)
+    return '%s-%s%07d.md' % (day.isoformat(), POST_MARKER, index)
+
+
+def render_sentences(seed, count=256):
+    """
+    Returns a pool of pseudo-random sentences derived from the seed. Posts are
+    assembled from this pool, which is a lot cheaper than drawing every word.
+    """
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 18))]
+        sentences.append(' '.join(words).capitalize() + '.')
+    return sentences
+
+
+def post_size(seed, index, size, profile):
+    """
+    Returns the body size in bytes of the post with the given index.
+    """
+    if profile == 'mixed':
+        rng = random.Random(seed * 1000033 + index)
+        return max(256, int(size * rng.lognormvariate(0, 0.75)))
+    return size
+
+
+def render_post(seed, index, size, sentences):
+    """
+    Returns the markdown body of a post of roughly `size` bytes.
+    """
+    rng = random.Random(seed * 1000003 + index)
+    lines = ['# Post %d' % index, '']
+    length = 0
+    while length < size:
+        paragraph = ' '.join(
+            rng.choice(sentences) for _ in range(rng.randint(3, 8)))
+        lines.append(paragraph)
+        lines.append('')
+        length += len(paragraph) + 1
+    return '\n'.join(lines)
+
+
+def write_posts(task):
+    """
+    Writes the posts in [start, end) into directory. Runs in a pool worker,
+    so it has to be a module level function.
+    """
+    directory, start, end, size, header, seed, profile = task
+    sentences = render_sentences(seed)
+    prefix = header_prefix(header)
+    for index in range(start, end):
+        body = render_post(seed, index,
+                           post_size(seed, index, size, profile), sentences)
+        with open(os.path.join(directory, post_file_name(index)),
+                  'w') as post:
+            post.write(prefix + body)
+    return end - start
+
+
+def header_prefix(header):
+    """
+    Returns the text that precedes the body of every post.
+    """
+    return header + '\n\n' if header else ''
+
+
+def clean(directory):
+    """
+    Removes every generated post from directory, leaving the sample posts.
+    """
+    for post in glob.glob(os.path.join(directory, '*%s*.md' % POST_MARKER)):
+        os.remove(post)
+
+
+def generate(directory,
+             file_number,
+             file_size,
+             header='',
+             seed=0,
+             profile='uniform',
+             processes=None):
+    """
+    Writes file_number markdown posts of file_size KB each into directory,
+    every one of them starting with the given front matter header. The same
+    seed and profile always produce byte-identical posts. Large corpora are
+    written in parallel across all the cores the calling thread may use.
+
+    Returns the number of posts written.
+    """
+    clean(directory)
+    try:
+        os.makedirs(directory)
+    except OSError:
+        pass
+
+    size = int(file_size) * 1024
+    processes = processes or len(scheduler.allowed())
+    chunk = max(1, min(1000, file_number // (processes * 4) + 1))
+    tasks = [(directory, start, min(start + chunk, file_number), size,
+              header, seed, profile) for start in range(0, file_number, chunk)]
+
+    if file_number < PARALLEL_THRESHOLD or processes == 1:
+        return sum(write_posts(task) for task in tasks)
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        return sum(pool.imap_unordered(write_posts, tasks))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+
+from toolset.utils import corpus
+from toolset.utils.output_helper import log
+
+
+class CorpusCache:
+    """
+    Content-addressed cache of generated corpora, shared by every generator
+    and every run that uses the same results root.
+
+    Post bodies are generated once per (file_number, file_size, seed, profile)
+    and stored without front matter. Each generator's front matter is then
+    applied once per header into a second entry, and that entry is hardlinked
+    into the test's content directory, so repeated tests and runs do not copy
+    the corpus at all. Entries are evicted least recently used first whenever
+    the cache grows beyond its quota.
+    """
+
+    # Guards the index when several tests prepare their corpus at once
+    lock = threading.Lock()
+
+    def __init__(self, config):
+        self.config = config
+        self.directory = os.path.join(config.results_root, 'corpus-cache')
+        self.index_file = os.path.join(self.directory, 'index.json')
+        self.quota = config.corpus_cache_quota * 1024 * 1024
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            pass
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def link(self, directory, header):
+        """
+        Makes the corpus of the current run, with the given front matter
+        header, appear in directory. Returns the number of posts.
+        """
+        corpus.clean(directory)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            pass
+
+        with CorpusCache.lock:
+            posts_dir = self.__get_posts(header)
+            names = os.listdir(posts_dir)
+            for name in names:
+                CorpusCache.__link_file(
+                    os.path.join(posts_dir, name), os.path.join(directory, name))
+        return len(names)
+
+    ##########################################################################################
+    # Private methods
+    ##########################################################################################
+
+    def __key(self, *parts):
+        return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()
+
+    def __body_parts(self):
+        return (self.config.file_number, self.config.file_size,
+                self.config.seed, self.config.corpus_profile)
+
+    def __get_bodies(self):
+        """
+        Returns the directory holding the header-less bodies of this corpus,
+        generating them first if they are not cached.
+        """
+        key = self.__key('bodies', *self.__body_parts())
+        path = os.path.join(self.directory, key)
+        if not os.path.isdir(path):
+            log("Generating corpus %s" % key)
+            tmp = path + '.tmp'
+            shutil.rmtree(tmp, ignore_errors=True)
+            file_number, file_size, seed, profile = self.__body_parts()
+            corpus.generate(
+                tmp, file_number, file_size, seed=seed, profile=profile)
+            os.rename(tmp, path)
+        self.__touch(key, path)
+        return path
+
+    def __get_posts(self, header):
+        """
+        Returns the directory holding this corpus with the given front matter
+        header applied to every post.
+        """
+        key = self.__key('posts', header, *self.__body_parts())
+        path = os.path.join(self.directory, key)
+        if not os.path.isdir(path):
+            bodies = self.__get_bodies()
+            tmp = path + '.tmp'
+            shutil.rmtree(tmp, ignore_errors=True)
+            os.makedirs(tmp)
+            prefix = corpus.header_prefix(header)
+            for name in os.listdir(bodies):
+                if not prefix:
+                    CorpusCache.__link_file(
+                        os.path.join(bodies, name), os.path.join(tmp, name))
+                    continue
+                with open(os.path.join(bodies, name), 'rb') as body, \
+                        open(os.path.join(tmp, name), 'wb') as post:
+                    post.write(prefix.encode('utf-8'))
+                    shutil.copyfileobj(body, post)
+            os.rename(tmp, path)
+        self.__touch(key, path)
+        return path
+
+    def __load_index(self):
+        try:
+            with open(self.index_file) as f:
+                return json.load(f)
+        except (ValueError, IOError):
+            return dict()
+
+    def __touch(self, key, path):
+        """
+        Marks the entry as most recently used and evicts the least recently
+        used entries until the cache fits its quota again.
+        """
+        index = self.__load_index()
+        entry = index.get(key)
+        if entry is None:
+            entry = {'size': CorpusCache.__disk_usage(path)}
+            index[key] = entry
+        entry['used'] = time.time()
+
+        total = sum(e['size'] for e in index.values())
+        for old_key in sorted(index, key=lambda k: index[k]['used']):
+            if total <= self.quota:
+                break
+            if old_key == key:
+                continue
+            log("Evicting corpus %s from the cache" % old_key)
+            shutil.rmtree(
+                os.path.join(self.directory, old_key), ignore_errors=True)
+            total -= index.pop(old_key)['size']
+
+        tmp = self.index_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.rename(tmp, self.index_file)
+
+    @staticmethod
+    def __disk_usage(path):
+        return sum(
+            os.path.getsize(os.path.join(path, name))
+            for name in os.listdir(path))
+
+    @staticmethod
+    def __link_file(source, target):
+        """
+        Hardlinks source to target, falling back to a copy when both are not
+        on the same filesystem.
+        """
+        try:
+            os.link(source, target)
+        except OSError:
+            shutil.copyfile(source, target)
@@ -0,0 +1,83 @@
+from toolset.utils import analysis
+
+
+def amdahl(counts, times):
+    """
+    Fits Amdahl's law, T(n) = T(1) * (s + (1 - s) / n), to the median build
+    time at every cpu count by least squares on T = a + b / n. Returns the
+    serial fraction s = a / (a + b), clamped to [0, 1], or None with fewer
+    than two cpu counts.
+    """
+    if len(set(counts)) < 2:
+        return None
+    xs = [1.0 / n for n in counts]
+    mean_x = sum(xs) / len(xs)
+    mean_t = sum(times) / float(len(times))
+    sxx = sum((x - mean_x)**2 for x in xs)
+    b = sum((x - mean_x) * (t - mean_t) for x, t in zip(xs, times)) / sxx
+    a = mean_t - b * mean_x
+    if a + b <= 0:
+        return None
+    return min(1.0, max(0.0, a / (a + b)))
+
+
+def describe(times_by_cpus):
+    """
+    Returns the speedup, the parallel efficiency and the Karp-Flatt serial
+    fraction of every cpu count relative to the smallest one, and the
+    fitted Amdahl serial fraction, from {cpus: times}.
+    """
+    counts = sorted(times_by_cpus)
+    medians = [analysis.median(sorted(times_by_cpus[n])) for n in counts]
+    base_cpus, base_time = counts[0], medians[0]
+    steps = []
+    for n, median in zip(counts, medians):
+        speedup = base_time / median if median > 0 else None
+        scale = float(n) / base_cpus
+        karp_flatt = None
+        if speedup and scale > 1:
+            karp_flatt = (1.0 / speedup - 1.0 / scale) / (1.0 - 1.0 / scale)
+        steps.append({
+            'cpus': n,
+            'median': median,
+            'speedup': speedup,
+            'efficiency': speedup / scale if speedup else None,
+            'karpFlatt': karp_flatt
+        })
+    serial = amdahl(counts, medians)
+    return {
+        'counts': steps,
+        'serialFraction': serial,
+        'maxSpeedup': 1.0 / serial if serial else None
+    }
+
+
+def summarize(raw_data):
+    """
+    Returns the cpu scaling of every generator from results.json rawData
+    of a --cpu-counts run, per series (see analysis.series) and corpus
+    size: {key: {'<files>-<size>kb': {generator: describe()}}}.
+    """
+    curves = dict()
+    for test_type, generators in raw_data.items():
+        if not isinstance(generators, dict):
+            continue
+        for name, results in generators.items():
+            if not isinstance(results, list):
+                continue
+            for r in results:
+                if not isinstance(r, dict) or not r.get('times') or \
+                        r.get('failed') or not r.get('cpus'):
+                    continue
+                key = analysis.series(test_type, r, cpus=False)
+                point = '%s-%skb' % (r.get('fileNumber'), r.get('fileSize'))
+                curves.setdefault(key, dict()).setdefault(
+                    point, dict()).setdefault(name, dict()).setdefault(
+                        r['cpus'], []).extend(r['times'])
+    summary = dict()
+    for key, points in curves.items():
+        for point, generators in points.items():
+            for name, times_by_cpus in generators.items():
+                summary.setdefault(key, dict()).setdefault(
+                    point, dict())[name] = describe(times_by_cpus)
+    return summary
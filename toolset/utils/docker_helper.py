@@ -2,13 +2,24 @@ import os
 import socket
 import json
 import docker
-import time
 import re
+import time
+import tarfile
+import tempfile
 import traceback
-from threading import Thread
-from colorama import Fore, Style
+from threading import Thread, Event
+from colorama import Fore
 
 from toolset.utils.output_helper import log
+from toolset.utils import cgroup
+from toolset.utils import build_context
+from toolset.utils import storage
+from toolset.utils import profiler
+from toolset.utils import hyperfine
+from toolset.utils.build_log import BuildLog
+
+# Seconds a server container may take to get ready
+READY_TIMEOUT = 60
 
 class DockerHelper:
 	def __init__(self, benchmarker=None):
@@ -18,49 +29,58 @@ class DockerHelper:
 			base_url=self.benchmarker.config.client_docker_host)
 		self.server = docker.DockerClient(
 			base_url=self.benchmarker.config.server_docker_host)
+		# Host device behind the volumes of the throttled storage profile
+		self.storage_device = None
 
 	def __build(self, base_url, path, build_log_file, log_prefix, dockerfile,
-				tag):
+				tag, cpuset=None):
 		"""
-		Builds docker containers using docker-py low-level api
+		Builds docker containers using docker-py low-level api, confined to
+		the given cpuset if any. Only the files the dockerfile copies are
+		streamed to the daemon as its context (see build_context). The
+		image is labelled with the digest of that context, and the build is
+		skipped when the image already carries the digest of the current
+		context, unless --force-rebuild is set. Only forced builds pull
+		newer base images.
 		"""
 
+		force = self.benchmarker.config.force_rebuild
 		self.benchmarker.time_logger.mark_build_start()
 		with open(build_log_file, 'w') as build_log:
 			try:
 				client = docker.APIClient(base_url=base_url)
+				digest = build_context.digest(path, dockerfile)
+				if not force and DockerHelper.__image_digest(client,
+															 tag) == digest:
+					log("Image %s is up to date (context %s), skipping build"
+						% (tag, digest[:12]),
+						prefix=log_prefix,
+						file=build_log)
+					self.benchmarker.time_logger.log_build_end(
+						log_prefix=log_prefix, file=build_log)
+					return
+				context = build_context.ContextStream(path, dockerfile)
 				output = client.build(
-					path=path,
+					fileobj=context,
+					custom_context=True,
 					dockerfile=dockerfile,
 					tag=tag,
 					forcerm=True,
 					timeout=3600,
-					pull=True)
-				buffer = ""
-				for token in output:
-					if token.startswith('{"stream":'):
-						token = json.loads(token)
-						token = token[token.keys()[0]].encode('utf-8')
-						buffer += token
-					elif token.startswith('{"errorDetail":'):
-						token = json.loads(token)
-						raise Exception(token['errorDetail']['message'])
-					while "\n" in buffer:
-						index = buffer.index("\n")
-						line = buffer[:index]
-						buffer = buffer[index + 1:]
-						log(line,
-							prefix=log_prefix,
-							file=build_log,
-							color=Fore.WHITE + Style.BRIGHT \
-								if re.match(r'^Step \d+\/\d+', line) else '')
-
-				if buffer:
-					log(buffer,
-						prefix=log_prefix,
-						file=build_log,
-						color=Fore.WHITE + Style.BRIGHT \
-							if re.match(r'^Step \d+\/\d+', buffer) else '')
+					pull=force,
+					labels={build_context.DIGEST_LABEL: digest},
+					container_limits={'cpusetcpus': cpuset} if cpuset else None)
+				log("Build context: %d files, %.1f MB sent in %.2f s" %
+					(len(context.names), context.size / (1024.0 * 1024.0),
+					context.upload_time() or 0.0),
+					prefix=log_prefix,
+					file=build_log)
+				build_log_stream = BuildLog(log_prefix, build_log)
+				for chunk in output:
+					build_log_stream.feed(chunk)
+				build_log_stream.close()
+				DockerHelper.__write_steps(build_log_file,
+										   build_log_stream.steps)
 			except Exception:
 				tb = traceback.format_exc()
 				log("Docker build failed; terminating",
@@ -75,6 +95,34 @@ class DockerHelper:
 			self.benchmarker.time_logger.log_build_end(
 				log_prefix=log_prefix, file=build_log)
 
+	@staticmethod
+	def __write_steps(build_log_file, steps):
+		"""
+		Writes the duration of every build step next to the build log, as
+		<image>.steps.json
+		"""
+		if build_log_file == os.devnull:
+			return
+		with open(os.path.splitext(build_log_file)[0] + '.steps.json',
+				  'w') as f:
+			json.dump([
+				dict((k, step[k])
+					 for k in ('step', 'steps', 'instruction', 'duration'))
+				for step in steps
+			], f, indent=2)
+
+	@staticmethod
+	def __image_digest(client, tag):
+		"""
+		Returns the build context digest the image tag was labelled with, or
+		None if there is no such image or label
+		"""
+		try:
+			labels = client.inspect_image(tag)['Config'].get('Labels')
+		except docker.errors.ImageNotFound:
+			return None
+		return (labels or {}).get(build_context.DIGEST_LABEL)
+
 	def clean(self):
 		"""
 		Cleans all the docker images from the system
@@ -89,7 +137,7 @@ class DockerHelper:
 					self.server.images.remove(image.id, force=True)
 		self.server.images.prune()
 
-	def build(self, test, build_log_dir=os.devnull):
+	def build(self, test, build_log_dir=os.devnull, cpuset=None):
 		"""
 		Builds the test docker containers
 		"""
@@ -111,7 +159,8 @@ class DockerHelper:
 				path=test.directory,
 				dockerfile=test_docker_file,
 				tag="matheusrv/ssgberk.test.%s" % test_docker_file.replace(
-					".dockerfile", ""))
+					".dockerfile", ""),
+				cpuset=cpuset)
 		except Exception:
 			return 1
 
@@ -137,6 +186,8 @@ class DockerHelper:
 
 			extra_hosts = None
 			name = "ssgberk-server"
+			if test.slot is not None:
+				name = "ssgberk-server-%d" % test.slot['index']
 
 			if self.benchmarker.config.network is None:
 				extra_hosts = {
@@ -159,8 +210,22 @@ class DockerHelper:
 				'soft': 99
 			}]
 
+			image = "matheusrv/ssgberk.test.%s" % test.name
+			storage_options, storage_script = self.__storage(test)
+			entrypoint = None
+			command = None
+			if storage_script:
+				# Move the directories before the image's own entrypoint runs
+				config = self.server.images.get(image).attrs['Config']
+				entrypoint = ['/bin/sh', '-c',
+							  storage_script + '\nexec "$@"', 'ssgberk']
+				command = (config.get('Entrypoint') or []) + \
+					(config.get('Cmd') or [])
+
 			container = self.server.containers.run(
-				"matheusrv/ssgberk.test.%s" % test.name,
+				image,
+				entrypoint=entrypoint,
+				command=command,
 				name=name,
 				network=self.benchmarker.config.network,
 				network_mode=self.benchmarker.config.network_mode,
@@ -172,7 +237,8 @@ class DockerHelper:
 				ulimits=ulimit,
 				sysctls=sysctl,
 				remove=True,
-				log_config={'type': None})
+				log_config={'type': None},
+				**dict(self.__limits(test.slot), **storage_options))
 
 			watch_thread = Thread(
 				target=watch_container,
@@ -196,6 +262,93 @@ class DockerHelper:
 
 		return container
 
+	def __limits(self, slot):
+		"""
+		Returns the containers.run arguments that confine a container to the
+		cores and memory of a scheduler slot, and to the current CPU count
+		of a CPU scaling run, see toolset/utils/scheduler.py
+		"""
+		limits = dict()
+		if slot is not None:
+			limits = {
+				'cpuset_cpus': slot['cpuset'],
+				'mem_limit': slot['memLimit'],
+				'memswap_limit': slot['memLimit']
+			}
+		cpus = self.benchmarker.scheduler.limit_cpus(slot)
+		if cpus is not None:
+			limits['cpuset_cpus'] = cpus
+		return limits
+
+	def __storage(self, test):
+		"""
+		Returns the containers.run arguments and the set-up script of the
+		current storage profile for a container of test, see
+		toolset/utils/storage.py. The content directory and the output
+		directory, if the test declares one, are moved onto the storage.
+		"""
+		config = self.benchmarker.config
+		if config.storage == 'throttled' and self.storage_device is None:
+			self.storage_device = self.__find_storage_device(test)
+		return (storage.options(config.storage, self.storage_device,
+								config.throttle_rate * 1024 * 1024,
+								config.throttle_iops),
+				storage.script(config.storage,
+							   DockerHelper.__storage_directories(test)))
+
+	@staticmethod
+	def __storage_directories(test):
+		"""
+		Returns the directories of test that are moved onto the storage of
+		a storage profile, relative to its `src` folder
+		"""
+		return [getattr(test, 'content_url', ''),
+				getattr(test, 'output_dir', '')]
+
+	@staticmethod
+	def __storage_bytes(test):
+		"""
+		Returns the bytes of memory the files of the storage directories of
+		test take once copied onto a tmpfs, in whole pages
+		"""
+		total = 0
+		for directory in DockerHelper.__storage_directories(test):
+			directory = directory.strip('/')
+			if not directory:
+				continue
+			for root, _, names in os.walk(
+					os.path.join(test.directory, 'src', directory)):
+				for name in names:
+					try:
+						size = os.lstat(os.path.join(root, name)).st_size
+					except OSError:
+						continue
+					total += -(-size // 4096) * 4096
+		return total
+
+	def __find_storage_device(self, test):
+		"""
+		Returns the block device of the server host that holds docker
+		volumes, which the throttled storage profile throttles
+		"""
+		output = self.server.containers.run(
+			"matheusrv/ssgberk.test.%s" % test.name,
+			entrypoint=['/bin/sh', '-c'],
+			command=[storage.DEVICE_SCRIPT],
+			network_mode='none',
+			privileged=True,
+			remove=True,
+			**storage.options('bind'))
+		device = storage.parse_device(output.decode('utf-8', 'replace'))
+		if device is None:
+			raise Exception(
+				"Cannot tell the block device of the docker volumes, "
+				"the throttled storage profile needs one")
+		log("Throttling %s to %d MB/s and %d IOPS" %
+			(device, self.benchmarker.config.throttle_rate,
+			 self.benchmarker.config.throttle_iops))
+		return device
+
 	@staticmethod
 	def __stop_container(container):
 		try:
@@ -229,15 +382,71 @@ class DockerHelper:
 
 	def build_hyperfine(self):
 		"""
-		Builds the matheusrv/ssgberk.hyperfine container
+		Builds the matheusrv/ssgberk.hyperfine container on the client, and
+		on the server, where the builds it times run
+		"""
+		config = self.benchmarker.config
+		for base_url in sorted(
+				set([config.client_docker_host, config.server_docker_host])):
+			self.__build(
+				base_url=base_url,
+				path=config.hyperfine_root,
+				dockerfile="hyperfine.dockerfile",
+				log_prefix="hyperfine: ",
+				build_log_file=os.devnull,
+				tag="matheusrv/ssgberk.hyperfine")
+
+	def build_profiler(self):
+		"""
+		Builds the matheusrv/ssgberk.profiler image of --profile on the
+		server, see toolset/profiler
 		"""
 		self.__build(
-			base_url=self.benchmarker.config.client_docker_host,
-			path=self.benchmarker.config.hyperfine_root,
-			dockerfile="hyperfine.dockerfile",
-			log_prefix="hyperfine: ",
+			base_url=self.benchmarker.config.server_docker_host,
+			path=self.benchmarker.config.profiler_root,
+			dockerfile="profiler.dockerfile",
+			log_prefix="profiler: ",
 			build_log_file=os.devnull,
-			tag="matheusrv/ssgberk.hyperfine")
+			tag="matheusrv/ssgberk.profiler")
+
+	def profiler_volume(self):
+		"""
+		Returns the name of the docker volume that holds the profilers and
+		is mounted into the generator containers of --profile, so that their
+		images stay as they are. The volume is named after the profiler
+		image, a rebuilt image gets a new one.
+		"""
+		return self.__image_volume("matheusrv/ssgberk.profiler",
+								   "ssgberk-profilers", profiler.ROOT)
+
+	def hyperfine_volume(self):
+		"""
+		Returns the name of the docker volume that holds hyperfine and its
+		script, mounted into the generator containers the builds are timed
+		in, see benchmark
+		"""
+		return self.__image_volume("matheusrv/ssgberk.hyperfine",
+								   "ssgberk-hyperfine", hyperfine.ROOT)
+
+	def __image_volume(self, tag, prefix, root):
+		"""
+		Returns the name of a docker volume on the server that holds the
+		files at root of the image tag. The volume is named after the
+		image, a rebuilt image gets a new one.
+		"""
+		image = self.server.images.get(tag)
+		name = "%s-%s" % (prefix, image.id.split(':')[-1][:12])
+		try:
+			self.server.volumes.get(name)
+		except docker.errors.NotFound:
+			# Docker fills a new volume with the files of the image it is
+			# mounted over
+			self.server.containers.run(
+				image.id, ['true'],
+				volumes={name: {'bind': root, 'mode': 'rw'}},
+				network_mode='none',
+				remove=True)
+		return name
 
 	def test_client_connection(self, url):
 		"""
@@ -257,6 +466,257 @@ class DockerHelper:
 
 		return True
 
+	def run_idle(self, test, profilers=False):
+		"""
+		Starts a container from the test image that only stays alive, so
+		that builds can be executed inside it with execute(). With
+		profilers, the profilers of --profile are mounted at profiler.ROOT.
+		"""
+		storage_options, storage_script = self.__storage(test)
+		if profilers:
+			storage_options['volumes'] = {
+				self.profiler_volume(): {
+					'bind': profiler.ROOT,
+					'mode': 'ro'
+				}
+			}
+		container = self.server.containers.run(
+			"matheusrv/ssgberk.test.%s" % test.name,
+			entrypoint=['/bin/sh', '-c'],
+			command=[
+				storage_script +
+				'\ntrap "exit 0" TERM; while true; do sleep 1; done'
+			],
+			network=self.benchmarker.config.network,
+			network_mode=self.benchmarker.config.network_mode,
+			detach=True,
+			init=True,
+			privileged=True,
+			remove=True,
+			log_config={'type': None},
+			**dict(self.__limits(test.slot), **storage_options))
+		DockerHelper.follow(test, container)
+		return container
+
+	def run_once(self, test, command):
+		"""
+		Runs the shell command in a fresh container of the test image and
+		removes the container. Returns the exit code, the output, the wall
+		time in seconds from starting the container until it exited and
+		the resources the command used, like execute_accounted.
+		"""
+		exit_code, _, output, elapsed, usage = self.run_limited(
+			test, command)
+		return exit_code, output, elapsed, usage
+
+	def run_limited(self, test, command, memory=None):
+		"""
+		Like run_once, with the container limited to memory bytes without
+		swap if given. Returns the exit code, whether the kernel killed the
+		container for running out of memory, the output, the wall time and
+		the resources used. The wall time leaves out the set-up of the
+		storage profile, and the memory the files copied onto a tmpfs take
+		is added to the limit.
+		"""
+		limits = self.__limits(test.slot)
+		if memory is not None:
+			if self.benchmarker.config.storage == 'tmpfs':
+				memory += self.__storage_bytes(test)
+			limits['mem_limit'] = memory
+			limits['memswap_limit'] = memory
+		storage_options, storage_script = self.__storage(test)
+		start = time.time()
+		container = self.server.containers.run(
+			"matheusrv/ssgberk.test.%s" % test.name,
+			entrypoint=['/bin/sh', '-c'],
+			command=[storage_script + '\n' + cgroup.wrap(command)],
+			network=self.benchmarker.config.network,
+			network_mode=self.benchmarker.config.network_mode,
+			detach=True,
+			init=True,
+			privileged=True,
+			**dict(limits, **storage_options))
+		DockerHelper.follow(test, container)
+		try:
+			exit_code = container.wait()['StatusCode']
+			elapsed = time.time() - start
+			container.reload()
+			oom_killed = container.attrs['State'].get('OOMKilled', False)
+			output = container.logs(stdout=True, stderr=True)
+		finally:
+			container.remove(force=True, v=True)
+		output, setup = storage.parse_setup(output)
+		output, snapshots = cgroup.parse(output)
+		usages = cgroup.usages(snapshots)
+		return (exit_code, oom_killed, output, elapsed - setup,
+				usages[0] if usages else None)
+
+	def memory_limit(self, test):
+		"""
+		Returns the memory, in bytes, containers of test may use at most:
+		the limit of its scheduler slot, or all of the server's memory
+		"""
+		return self.__limits(test.slot).get('mem_limit') or \
+			self.server.info()['MemTotal']
+
+	def drop_caches(self, test):
+		"""
+		Writes back dirty pages and drops the page cache, dentries and
+		inodes of the server host, from a privileged helper container of
+		the test image, so that the next build reads everything from disk
+		"""
+		self.server.containers.run(
+			"matheusrv/ssgberk.test.%s" % test.name,
+			entrypoint=['/bin/sh', '-c'],
+			command=['sync && echo 3 > /proc/sys/vm/drop_caches'],
+			network_mode='none',
+			privileged=True,
+			remove=True)
+
+	@staticmethod
+	def execute(container, command, detach=False):
+		"""
+		Runs the shell command inside the given container, in the working
+		directory of its image. Returns the exit code, the output and the
+		wall time in seconds, as seen from the toolset. Detached commands
+		return immediately and keep running in the background.
+		"""
+		start = time.time()
+		exit_code, output = container.exec_run(
+			['/bin/sh', '-c', command], detach=detach)
+		return exit_code, output, time.time() - start
+
+	@staticmethod
+	def follow(test, container):
+		"""
+		Points the sampler of test, while it is benchmarked, at the
+		container its builds run in from now on
+		"""
+		if getattr(test, 'sampler', None) is not None:
+			test.sampler.follow(container.id)
+
+	@staticmethod
+	def copy_from(container, path, directory):
+		"""
+		Copies the file or directory at path in the container into the
+		given directory of the toolset's host
+		"""
+		stream, _ = container.get_archive(path)
+		with tempfile.TemporaryFile() as archive:
+			for chunk in stream:
+				archive.write(chunk)
+			archive.seek(0)
+			with tarfile.open(fileobj=archive) as tar:
+				tar.extractall(directory)
+
+	@staticmethod
+	def execute_accounted(container, command):
+		"""
+		Like execute, but also returns the resources the command used,
+		read from the container's own cgroup counters.
+		"""
+		exit_code, output, elapsed = DockerHelper.execute(
+			container, cgroup.wrap(command))
+		output, snapshots = cgroup.parse(output)
+		usages = cgroup.usages(snapshots)
+		return exit_code, output, elapsed, usages[0] if usages else None
+
+	def wait_until_ready(self, container, readiness=None, started=None):
+		"""
+		Blocks until the server container is ready and returns the seconds
+		it took since started (by default now), or None if it did not get
+		ready in time or exited first.
+
+		readiness is the optional `readiness` probe of benchmark_config.json:
+		{"log": regex} waits for a matching line of the container output,
+		{"file": path} for the path to exist in the container and
+		{"port": port} for the container to listen on the TCP port, each
+		with an optional "timeout" in seconds. Without a probe the
+		container is ready once it is running, or once its entrypoint has
+		finished if it exited first. Nothing is polled from here: exits come
+		from the docker events API, logs are followed, and files and ports
+		are waited for inside the container.
+		"""
+		readiness = readiness or dict()
+		started = started or time.time()
+		timeout = readiness.get('timeout', READY_TIMEOUT)
+		ready = Event()
+		outcome = dict()
+
+		def mark(state):
+			if not ready.is_set():
+				outcome['state'] = state
+				outcome['time'] = time.time()
+				ready.set()
+
+		def watch_events():
+			try:
+				for _ in self.server.events(
+						since=int(started) - 1,
+						until=int(started + timeout) + 1,
+						filters={
+							'container': container.id,
+							'event': ['die', 'oom']
+						},
+						decode=True):
+					mark('exited')
+					return
+			except Exception:
+				pass
+
+		def watch_logs(pattern):
+			try:
+				for line in container.logs(stream=True, follow=True):
+					if pattern.search(line.decode('utf-8', 'replace')):
+						mark('ready')
+						return
+			except Exception:
+				pass
+
+		def watch_running():
+			try:
+				container.reload()
+				if container.status == 'running':
+					mark('ready')
+			except Exception:
+				pass
+
+		def watch_exec(script):
+			try:
+				exit_code, _ = container.exec_run(['sh', '-c', script])
+				if exit_code == 0:
+					mark('ready')
+			except Exception:
+				pass
+
+		watchers = [(watch_events, ())]
+		if 'log' in readiness:
+			watchers.append((watch_logs, (re.compile(readiness['log']), )))
+		elif 'file' in readiness:
+			watchers.append(
+				(watch_exec, ("until [ -e '%s' ]; do sleep 0.05; done" %
+							  readiness['file'].replace("'", "'\\''"), )))
+		elif 'port' in readiness:
+			# A listening socket (state 0A) on the port, in hex, over IPv4 or
+			# IPv6; /proc works in any image, unlike nc or curl
+			watchers.append((watch_exec, (
+				"until grep -qE ':%04X [0-9A-F]+:[0-9A-F]+ 0A' "
+				"/proc/net/tcp /proc/net/tcp6 2>/dev/null; do sleep 0.05; done"
+				% int(readiness['port']), )))
+		else:
+			watchers.append((watch_running, ()))
+		for target, args in watchers:
+			watcher = Thread(target=target, args=args)
+			watcher.daemon = True
+			watcher.start()
+
+		ready.wait(max(0.0, started + timeout - time.time()))
+		probed = any(k in readiness for k in ('log', 'file', 'port'))
+		if outcome.get('state') not in (('ready', ) if probed else
+										('ready', 'exited')):
+			return None
+		return outcome['time'] - started
+
 	def server_container_exists(self, container_id_or_name):
 		"""
 		Returns True if the container still exists on the server.
@@ -267,12 +727,16 @@ class DockerHelper:
 		except:
 			return False
 
-	def benchmark(self, script, variables, raw_file):
+	def benchmark(self, script, variables, raw_file, slot=None, test=None):
 		"""
-		Runs the given remote_script on the hyperfine container on the client machine.
+		Runs the given script of the hyperfine image in a container of the
+		test image, with hyperfine mounted from hyperfine_volume, so that
+		the builds it times have the generator's toolchain. The builds of
+		test run in that container, see follow.
 		"""
 
 		def watch_container(container):
+			DockerHelper.follow(test, container)
 			with open(raw_file, 'w') as benchmark_file:
 				for line in container.logs(stream=True):
 					log(line, file=benchmark_file)
@@ -281,16 +745,30 @@ class DockerHelper:
 
 		ulimit = [{'name': 'nofile', 'hard': 65535, 'soft': 65535}]
 
+		storage_options, storage_script = self.__storage(test)
+		storage_options['volumes'] = {
+			self.hyperfine_volume(): {
+				'bind': hyperfine.ROOT,
+				'mode': 'ro'
+			}
+		}
 		watch_container(
-			self.client.containers.run(
-				"matheusrv/ssgberk.hyperfine",
-				"/bin/bash /%s" % script,
+			self.server.containers.run(
+				"matheusrv/ssgberk.test.%s" % test.name,
+				entrypoint=['/bin/sh', '-c'],
+				command=[
+					storage_script +
+					'\nexec sh %s/%s' % (hyperfine.ROOT, script)
+				],
 				environment=variables,
 				network=self.benchmarker.config.network,
 				network_mode=self.benchmarker.config.network_mode,
 				detach=True,
 				stderr=True,
+				init=True,
+				privileged=True,
 				ulimits=ulimit,
 				sysctls=sysctl,
 				remove=True,
-				log_config={'type': None}))
+				log_config={'type': None},
+				**dict(self.__limits(slot), **storage_options)))
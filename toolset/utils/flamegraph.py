@@ -0,0 +1,103 @@
+import zlib
+from xml.sax.saxutils import escape
+
+# Geometry of the SVG, in pixels
+WIDTH = 1200
+FRAME_HEIGHT = 16
+PADDING = 10
+TITLE_HEIGHT = 24
+
+# Frames narrower than this are left out, like flamegraph.pl does
+MIN_WIDTH = 0.1
+
+# Pixels per character of the 12px monospace labels
+CHAR_WIDTH = 7.2
+
+
+def tree(counts):
+    """
+    Merges collapsed stacks, {'root;child;leaf': samples}, into a tree of
+    {'name', 'value', 'children': {name: node}} whose root holds them all.
+    """
+    root = {'name': 'all', 'value': 0, 'children': dict()}
+    for stack, count in counts.items():
+        node = root
+        node['value'] += count
+        for frame in stack.split(';'):
+            children = node['children']
+            if frame not in children:
+                children[frame] = {
+                    'name': frame,
+                    'value': 0,
+                    'children': dict()
+                }
+            node = children[frame]
+            node['value'] += count
+    return root
+
+
+def color(name):
+    """
+    Returns the same warm colour for a frame name in every graph, so that
+    graphs of several generators or runs can be compared at a glance.
+    """
+    hashed = zlib.crc32(name.encode('utf-8')) & 0xffffffff
+    return 'rgb(%d,%d,%d)' % (205 + hashed % 50, (hashed >> 8) % 230,
+                              (hashed >> 16) % 55)
+
+
+def svg(counts, title):
+    """
+    Returns a flame graph of collapsed stacks as a standalone SVG document:
+    callers at the bottom, the width of a frame proportional to the samples
+    it was on the stack for, siblings sorted by name. Hovering a frame shows
+    its name and samples.
+    """
+    root = tree(counts)
+    total = float(root['value']) or 1.0
+    scale = (WIDTH - 2 * PADDING) / total
+    frames = []
+    depth = [0]
+
+    def place(node, x, level):
+        width = node['value'] * scale
+        if width < MIN_WIDTH:
+            return
+        depth[0] = max(depth[0], level)
+        frames.append((node, x, level, width))
+        for name in sorted(node['children']):
+            child = node['children'][name]
+            place(child, x, level + 1)
+            x += child['value'] * scale
+
+    place(root, PADDING, 0)
+    height = TITLE_HEIGHT + (depth[0] + 1) * FRAME_HEIGHT + 2 * PADDING
+
+    lines = [
+        '<?xml version="1.0" standalone="no"?>',
+        '<svg version="1.1" width="%d" height="%d" '
+        'xmlns="http://www.w3.org/2000/svg" '
+        'font-family="monospace" font-size="12">' % (WIDTH, height),
+        '<rect width="100%" height="100%" fill="#f8f8f8"/>',
+        '<text x="%d" y="%d" text-anchor="middle" font-size="16">%s</text>' %
+        (WIDTH // 2, PADDING + 14, escape(title))
+    ]
+    for node, x, level, width in frames:
+        y = height - PADDING - (level + 1) * FRAME_HEIGHT
+        label = '%s (%d samples, %.2f%%)' % (node['name'], node['value'],
+                                             100.0 * node['value'] / total)
+        lines.append('<g><title>%s</title>' % escape(label))
+        lines.append(
+            '<rect x="%.1f" y="%d" width="%.1f" height="%d" fill="%s" '
+            'rx="2" ry="2"/>' % (x, y, width, FRAME_HEIGHT - 1,
+                                 color(node['name'])))
+        characters = int((width - 6) / CHAR_WIDTH)
+        if characters >= 3:
+            text = node['name']
+            if len(text) > characters:
+                text = text[:characters - 2] + '..'
+            lines.append('<text x="%.1f" y="%d">%s</text>' %
+                         (x + 3, y + FRAME_HEIGHT - 4, escape(text)))
+        lines.append('</g>')
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,259 @@
+import os
+import json
+import sqlite3
+
+from toolset.utils import analysis
+
+# Earlier runs that make up the noise band of a generator
+HISTORY_RUNS = 10
+
+# Fewest earlier runs needed before a run can be flagged
+MIN_HISTORY = 3
+
+# Width of the noise band, in standard deviations estimated from the MAD of
+# the earlier medians
+NOISE_BAND = 3.0
+
+# Smallest relative change ever flagged, so that a history of near-identical
+# medians does not turn every blip into a regression
+MIN_CHANGE = 0.02
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+  timestamp TEXT PRIMARY KEY,
+  uuid TEXT,
+  name TEXT,
+  commit_id TEXT,
+  branch TEXT,
+  start_time INTEGER,
+  concurrency INTEGER,
+  mtime REAL
+);
+CREATE TABLE IF NOT EXISTS samples (
+  timestamp TEXT,
+  test_type TEXT,
+  generator TEXT,
+  version TEXT,
+  file_number INTEGER,
+  file_size INTEGER,
+  median REAL,
+  mad REAL,
+  times TEXT
+);
+CREATE INDEX IF NOT EXISTS samples_by_generator
+  ON samples (generator, test_type, file_number, file_size, timestamp);
+CREATE INDEX IF NOT EXISTS samples_by_version
+  ON samples (generator, version);
+CREATE INDEX IF NOT EXISTS runs_by_commit ON runs (commit_id);
+'''
+
+
+class History:
+    """
+    An SQLite index of every results/<timestamp>/results.json, with the
+    per-iteration times of each generator by test type, generator version,
+    corpus size and git commit. Timestamp directories are (re)indexed
+    whenever their results.json changed since the last look.
+    """
+
+    def __init__(self, results_root):
+        self.results_root = results_root
+        self.connection = sqlite3.connect(
+            os.path.join(results_root, 'history.db'))
+        self.connection.executescript(SCHEMA)
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def index(self):
+        """
+        Indexes every timestamp directory that is new or changed.
+        """
+        known = dict(
+            self.connection.execute('SELECT timestamp, mtime FROM runs'))
+        for timestamp in sorted(os.listdir(self.results_root)):
+            results_file = os.path.join(self.results_root, timestamp,
+                                        'results.json')
+            if not os.path.isfile(results_file):
+                continue
+            mtime = os.path.getmtime(results_file)
+            if known.get(timestamp) == mtime:
+                continue
+            try:
+                with open(results_file) as f:
+                    results = json.load(f)
+            except (ValueError, IOError):
+                continue
+            self.add(timestamp, results, mtime)
+
+    def add(self, timestamp, results, mtime=None):
+        """
+        Replaces the indexed rows of the run at timestamp with the given
+        results.json contents.
+        """
+        git = results.get('git') or dict()
+        versions = results.get('versions') or dict()
+        with self.connection:
+            self.connection.execute('DELETE FROM runs WHERE timestamp = ?',
+                                    (timestamp, ))
+            self.connection.execute('DELETE FROM samples WHERE timestamp = ?',
+                                    (timestamp, ))
+            self.connection.execute(
+                'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (timestamp, results.get('uuid'), results.get('name'),
+                 git.get('commitId'), git.get('branchName'),
+                 results.get('startTime'), results.get('concurrency', 1),
+                 mtime))
+            for key, points in analysis.group(
+                    results.get('rawData') or dict()).items():
+                for (file_number, file_size), samples in points.items():
+                    for generator, times in samples.items():
+                        ordered = sorted(times)
+                        self.connection.execute(
+                            'INSERT INTO samples VALUES '
+                            '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                            (timestamp, key, generator,
+                             versions.get(generator), file_number,
+                             file_size, analysis.median(ordered),
+                             analysis.mad(ordered), json.dumps(times)))
+
+    def samples(self, timestamp):
+        """
+        Returns the indexed rows of one run as a dict keyed by (test_type,
+        generator, file_number, file_size).
+        """
+        rows = self.connection.execute(
+            'SELECT test_type, generator, file_number, file_size, version, '
+            'median, mad, times FROM samples WHERE timestamp = ?',
+            (timestamp, ))
+        return dict((row[:4], {
+            'version': row[4],
+            'median': row[5],
+            'mad': row[6],
+            'times': json.loads(row[7])
+        }) for row in rows)
+
+    def regressions(self, timestamp):
+        """
+        Compares every generator of the run at timestamp against the noise
+        band of its medians over the HISTORY_RUNS runs before it. Returns
+        one finding per generator, test type and corpus size with enough
+        history.
+        """
+        findings = []
+        for (test_type, generator, file_number, file_size), current in \
+                sorted(self.samples(timestamp).items()):
+            history = [
+                row[0] for row in self.connection.execute(
+                    'SELECT median FROM samples WHERE generator = ? AND '
+                    'test_type = ? AND file_number = ? AND file_size = ? '
+                    'AND timestamp < ? ORDER BY timestamp DESC LIMIT ?',
+                    (generator, test_type, file_number, file_size,
+                     timestamp, HISTORY_RUNS))
+            ]
+            if len(history) < MIN_HISTORY:
+                continue
+            ordered = sorted(history)
+            center = analysis.median(ordered)
+            band = max(NOISE_BAND * analysis.MAD_SCALE *
+                       analysis.mad(ordered, center), MIN_CHANGE * center)
+            finding = History.__finding(test_type, generator, file_number,
+                                        file_size, current, center)
+            finding['history'] = len(history)
+            finding['band'] = [center - band, center + band]
+            if current['median'] > center + band:
+                finding['status'] = 'regression'
+            elif current['median'] < center - band:
+                finding['status'] = 'improvement'
+            else:
+                finding['status'] = 'unchanged'
+            findings.append(finding)
+        return findings
+
+    def compare(self, timestamp, baseline):
+        """
+        Compares every generator of the run at timestamp with the same
+        generator in the baseline run, by a Mann-Whitney U test of their
+        per-iteration times.
+        """
+        previous = self.samples(baseline)
+        findings = []
+        for key, current in sorted(self.samples(timestamp).items()):
+            if key not in previous:
+                continue
+            before = previous[key]
+            finding = History.__finding(key[0], key[1], key[2], key[3],
+                                        current, before['median'])
+            finding['baselineVersion'] = before['version']
+            u, p, delta = analysis.mann_whitney(current['times'],
+                                                before['times'])
+            finding['pValue'] = p
+            finding['cliffsDelta'] = delta
+            if p >= analysis.SIGNIFICANCE:
+                finding['status'] = 'unchanged'
+            elif delta > 0:
+                finding['status'] = 'regression'
+            else:
+                finding['status'] = 'improvement'
+            findings.append(finding)
+        return findings
+
+    def interference(self, timestamp):
+        """
+        Compares every generator of the concurrent run at timestamp with its
+        latest isolated run, one test at a time, before it. The change of
+        the median is the slowdown caused by the tests in the other slots.
+        """
+        findings = []
+        for key, current in sorted(self.samples(timestamp).items()):
+            row = self.connection.execute(
+                'SELECT samples.timestamp, median, times FROM samples '
+                'JOIN runs ON runs.timestamp = samples.timestamp '
+                'WHERE generator = ? AND test_type = ? AND file_number = ? '
+                'AND file_size = ? AND samples.timestamp < ? AND '
+                'runs.concurrency <= 1 ORDER BY samples.timestamp DESC '
+                'LIMIT 1', (key[1], key[0], key[2], key[3],
+                            timestamp)).fetchone()
+            if row is None:
+                continue
+            finding = History.__finding(key[0], key[1], key[2], key[3],
+                                        current, row[1])
+            finding['isolated'] = row[0]
+            finding['pValue'] = analysis.mann_whitney(
+                current['times'], json.loads(row[2]))[1]
+            findings.append(finding)
+        return findings
+
+    def close(self):
+        self.connection.close()
+
+    ##########################################################################################
+    # Private methods
+    ##########################################################################################
+
+    @staticmethod
+    def __finding(test_type, generator, file_number, file_size, current,
+                  baseline):
+        return {
+            'testType': test_type,
+            'generator': generator,
+            'version': current['version'],
+            'fileNumber': file_number,
+            'fileSize': file_size,
+            'median': current['median'],
+            'baseline': baseline,
+            'change': current['median'] / baseline - 1 if baseline else None
+        }
+
+
+def over_budget(findings, budget):
+    """
+    Returns the findings that are both a significant regression and slower
+    than their baseline by more than budget percent.
+    """
+    return [
+        f for f in findings
+        if f['status'] == 'regression' and f['change'] is not None and
+        f['change'] * 100 > budget
+    ]
@@ -0,0 +1,44 @@
+import json
+
+# Where the volume holding hyperfine and toolset/hyperfine/build.sh is
+# mounted in the generator containers, see DockerHelper.hyperfine_volume
+ROOT = '/opt/ssgberk-hyperfine'
+
+# Brackets the JSON export that toolset/hyperfine/build.sh prints after
+# the benchmark
+EXPORT_MARKER = 'ssgberk-hyperfine-json'
+
+# Summary keys of a hyperfine result and the names they are stored under
+SUMMARY_KEYS = [('mean', 'mean'), ('stddev', 'stddev'), ('median', 'median'),
+                ('min', 'min'), ('max', 'max'), ('user', 'userMean'),
+                ('system', 'systemMean')]
+
+
+def parse(output):
+    """
+    Returns one result per benchmarked command of the hyperfine JSON export
+    in output, or an empty list if there is none. Every result keeps the
+    time of each iteration in seconds under 'times'.
+    """
+    exports = output.split(EXPORT_MARKER)
+    if len(exports) < 3:
+        return []
+    try:
+        export = json.loads(exports[1])
+    except ValueError:
+        return []
+
+    results = []
+    for benchmark in export.get('results', []):
+        result = {
+            'command': benchmark.get('command'),
+            'times': benchmark.get('times', [])
+        }
+        for key, name in SUMMARY_KEYS:
+            if key in benchmark:
+                result[name] = benchmark[key]
+        if benchmark.get('exit_codes'):
+            result['exitCodes'] = benchmark['exit_codes']
+            result['failed'] = any(benchmark['exit_codes'])
+        results.append(result)
+    return results
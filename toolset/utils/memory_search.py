@@ -0,0 +1,71 @@
+# Docker refuses memory limits below 6 MB
+MIN_MEMORY = 6 * 1024 * 1024
+
+# Multiples of the minimum viable memory the build is timed at, to show the
+# slowdown close to the limit
+CURVE_FACTORS = [1.0, 1.25, 1.5, 2.0, 4.0]
+
+MEGABYTE = 1024 * 1024
+
+
+def search(probe, upper, precision, lower=MIN_MEMORY):
+    """
+    Binary-searches the smallest memory limit, in bytes, at which
+    probe(memory) succeeds, between lower (assumed to fail) and upper.
+    probe returns an outcome, 'ok', 'oom' for an OOM kill or 'failed', and
+    the build time in seconds. Every failure counts as too little memory,
+    the build having succeeded at upper first. Stops when the bounds are
+    precision bytes apart and returns the minimum, None if the build fails
+    even at upper, and every probe as a curve point.
+    """
+    curve = []
+
+    def measure(memory):
+        outcome, elapsed = probe(memory)
+        curve.append({
+            'memory': memory,
+            'time': elapsed if outcome == 'ok' else None,
+            'outcome': outcome
+        })
+        return outcome == 'ok'
+
+    if not measure(upper):
+        return None, curve
+    while upper - lower > precision:
+        # Whole megabytes keep the limits readable
+        middle = (lower + upper) // 2 // MEGABYTE * MEGABYTE
+        if middle <= lower:
+            break
+        if measure(middle):
+            upper = middle
+        else:
+            lower = middle
+    return upper, curve
+
+
+def summarize(raw_data):
+    """
+    Returns the minimum viable memory and the time-vs-memory curve of every
+    memory search in results.json rawData, per test type, generator and
+    corpus size.
+    """
+    summary = dict()
+    for test_type, generators in raw_data.items():
+        if not isinstance(generators, dict):
+            continue
+        for name, results in generators.items():
+            if not isinstance(results, list):
+                continue
+            for r in results:
+                if not isinstance(r, dict) or \
+                        r.get('scenario') != 'memory-search':
+                    continue
+                point = '%s-%skb' % (r.get('fileNumber'), r.get('fileSize'))
+                summary.setdefault(test_type, dict()).setdefault(
+                    name, dict())[point] = {
+                        'minimumMemory': r.get('minimumMemory'),
+                        'upperMemory': r.get('upperMemory'),
+                        'curve': sorted(r.get('curve') or [],
+                                        key=lambda p: p['memory'])
+                    }
+    return summary
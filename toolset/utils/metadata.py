@@ -5,6 +5,7 @@ import json
 from collections import OrderedDict
 
 from toolset.utils.output_helper import log
+from toolset.utils import profiler
 from colorama import Fore
 
 
@@ -293,6 +294,9 @@ class Metadata:
 
 		# Check the (all optional) test urls
 		Metadata.validate_urls(test_name, test_keys)
+		Metadata.validate_readiness(test_name, test_keys)
+		Metadata.validate_profiler(test_name, test_keys)
+		Metadata.validate_version_command(test_name, test_keys)
 
 		def get_test_val(k):
 			return test_keys.get(k, "none").lower()
@@ -358,3 +362,50 @@ class Metadata:
 			Example `%s` url: \"%s\"
 		  """ % (test_url, test_name, key_value, test_url, example_urls[test_url])
 				raise Exception(errmsg)
+
+	@staticmethod
+	def validate_readiness(test_name, test_keys):
+		"""
+		Checks the optional `readiness` probe, which tells when the server
+		container of a test is ready to be benchmarked, see
+		DockerHelper.wait_until_ready
+		"""
+		readiness = test_keys.get('readiness')
+		if readiness is None:
+			return
+		probes = [k for k in ('log', 'file', 'port') if k in readiness] \
+			if isinstance(readiness, dict) else []
+		if len(probes) != 1 or not all(
+				k in ('log', 'file', 'port', 'timeout') for k in readiness):
+			raise Exception(
+				"`readiness` of test \"%s\" needs exactly one of `log` (a "
+				"regular expression), `file` (a path) or `port`, and an "
+				"optional `timeout` in seconds, e.g. {\"port\": 8080}" %
+				test_name)
+
+	@staticmethod
+	def validate_profiler(test_name, test_keys):
+		"""
+		Checks the optional `profiler` of a test, which --profile uses
+		instead of the one of its language, see toolset/utils/profiler.py
+		"""
+		name = test_keys.get('profiler')
+		if name is not None and name not in profiler.NAMES:
+			raise Exception(
+				"`profiler` of test \"%s\" should be one of %s" %
+				(test_name, ", ".join(profiler.NAMES)))
+
+	@staticmethod
+	def validate_version_command(test_name, test_keys):
+		"""
+		Checks the optional `version_command` of a test, whose first line of
+		output is recorded as the generator version, see
+		GeneratorTest.get_version
+		"""
+		command = test_keys.get('version_command')
+		if command is not None and not (hasattr(command, 'strip')
+										and command.strip()):
+			raise Exception(
+				"`version_command` of test \"%s\" should be a shell command "
+				"that prints the generator version, e.g. \"hugo version\"" %
+				test_name)
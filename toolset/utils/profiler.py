@@ -0,0 +1,207 @@
+import io
+import os
+import re
+import json
+
+from toolset.utils import flamegraph
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+# Where the volume holding the profilers of toolset/profiler is mounted in
+# the generator containers, see DockerHelper.profiler_volume
+ROOT = '/opt/ssgberk-profilers'
+BIN = ROOT + '/bin'
+
+# Where the profilers write their output in the generator container
+OUTPUT = '/tmp/ssgberk-profile'
+
+# Samples per second; odd so that it does not beat with periodic work
+SAMPLE_RATE = 499
+
+# The sampling profiler of every language of the suite. Interpreted
+# generators are profiled in terms of their own code, compiled ones (Go) and
+# anything else natively with perf. A test can pick another one with the
+# optional `profiler` key of its benchmark_config.json. Keyed by the
+# lowercase language, as Metadata.validate_test normalizes it.
+PROFILERS = {'python': 'py-spy', 'ruby': 'rbspy', 'javascript': 'node'}
+DEFAULT = 'perf'
+NAMES = ['py-spy', 'rbspy', 'node', 'perf']
+
+
+def choose(test):
+    """
+    Returns the profiler of test: its `profiler` key, or the one of its
+    language.
+    """
+    language = getattr(test, 'language', None) or ''
+    return getattr(test, 'profiler', None) or \
+        PROFILERS.get(language.lower(), DEFAULT)
+
+
+def command(profiler, build_command):
+    """
+    Returns the shell command that runs build_command under profiler and
+    leaves its raw output in OUTPUT. Every profiler follows the processes
+    the build starts.
+
+    node starts every Node.js process with --cpu-prof (Node.js 12 and
+    later), and falls back to perf on older versions, which only see the
+    frames of the runtime itself.
+    """
+    build = quote(build_command)
+    perf = ('%s/perf record -q -F %d -g -o %s/perf.data -- sh -c %s && '
+            '%s/perf script -i %s/perf.data > %s/perf.script && '
+            'rm -f %s/perf.data' % (BIN, SAMPLE_RATE, OUTPUT, build, BIN,
+                                    OUTPUT, OUTPUT, OUTPUT))
+    if profiler == 'py-spy':
+        run = ('%s/py-spy record --subprocesses --nonblocking --rate %d '
+               '--format raw --output %s/py-spy.folded -- sh -c %s' %
+               (BIN, SAMPLE_RATE, OUTPUT, build))
+    elif profiler == 'rbspy':
+        run = ('%s/rbspy record --silent --subprocesses --rate %d '
+               '--format collapsed --file %s/rbspy.folded -- sh -c %s' %
+               (BIN, SAMPLE_RATE, OUTPUT, build))
+    elif profiler == 'node':
+        run = ('if node --help 2>/dev/null | grep -q -- --cpu-prof; then '
+               'NODE_OPTIONS="$NODE_OPTIONS --cpu-prof --cpu-prof-dir=%s/node" '
+               'sh -c %s; else %s; fi' % (OUTPUT, build, perf))
+    else:
+        run = perf
+    return 'rm -rf %s && mkdir -p %s && %s' % (OUTPUT, OUTPUT, run)
+
+
+def clean(frame):
+    """
+    Frames are separated by semicolons in collapsed stacks
+    """
+    return frame.replace(';', ':').strip() or '[unknown]'
+
+
+def read_folded(path, counts):
+    """
+    Adds the collapsed stacks of a `stack count` file to counts
+    """
+    with io.open(path, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack and count.isdigit():
+                counts[stack] = counts.get(stack, 0) + int(count)
+
+
+def collapse_perf(lines, counts):
+    """
+    Adds the call stacks of `perf script` output to counts, collapsed the
+    way stackcollapse-perf.pl does: the command name, then the frames from
+    the outermost caller in. Unknown symbols are named after their binary.
+    """
+    comm = None
+    frames = []
+
+    def end():
+        if comm is not None and frames:
+            stack = ';'.join([comm] + frames[::-1])
+            counts[stack] = counts.get(stack, 0) + 1
+
+    for line in lines:
+        line = line.rstrip('\n')
+        if not line.strip():
+            end()
+            comm = None
+            frames = []
+        elif line[0] in ' \t':
+            # "    55d1c0a1 runtime.mallocgc+0x2a (/usr/bin/hugo)"
+            parts = line.strip().split(None, 1)
+            if comm is None or len(parts) < 2:
+                continue
+            symbol, _, binary = parts[1].rpartition(' (')
+            if not symbol:
+                symbol, binary = parts[1], ''
+            symbol = re.sub(r'\+0x[0-9a-f]+$', '', symbol)
+            if symbol == '[unknown]':
+                binary = os.path.basename(binary.rstrip(')'))
+                symbol = binary if binary.startswith('[') else \
+                    '[%s]' % binary
+            frames.append(clean(symbol))
+        else:
+            # "hugo 1234/1240 [002] 1234.567: 2004008 cycles:"
+            header = re.match(r'^\s*(.+?)\s+\d+(/\d+)?\s', line)
+            end()
+            comm = clean(header.group(1)) if header else None
+            frames = []
+    end()
+
+
+def collapse_cpuprofile(profile, counts):
+    """
+    Adds the samples of a V8 .cpuprofile to counts, one collapsed stack per
+    sample from the root of the call tree down. Idle samples are left out.
+    """
+    nodes = dict((node['id'], node) for node in profile.get('nodes', []))
+    parents = dict()
+    for node in nodes.values():
+        for child in node.get('children', []):
+            parents[child] = node['id']
+    stacks = dict()
+
+    def stack(node_id):
+        if node_id not in stacks:
+            frames = []
+            current = node_id
+            while current in nodes:
+                frame = nodes[current].get('callFrame', dict())
+                name = frame.get('functionName') or '(anonymous)'
+                if frame.get('url'):
+                    name = '%s %s:%d' % (name, os.path.basename(
+                        frame['url']), frame.get('lineNumber', -1) + 1)
+                if name != '(root)':
+                    frames.append(clean(name))
+                current = parents.get(current)
+            stacks[node_id] = ';'.join(frames[::-1])
+        return stacks[node_id]
+
+    for node_id in profile.get('samples', []):
+        key = stack(node_id)
+        if key and key != '(idle)':
+            counts[key] = counts.get(key, 0) + 1
+
+
+def collect(directory):
+    """
+    Returns the collapsed stacks, {stack: samples}, of all the raw profiler
+    output in directory: collapsed stacks (*.folded), perf script output
+    (*.script) and V8 profiles (*.cpuprofile) of every Node.js process.
+    """
+    counts = dict()
+    for root, _, names in os.walk(directory):
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            if name.endswith('.folded'):
+                read_folded(path, counts)
+            elif name.endswith('.script'):
+                with io.open(path, encoding='utf-8', errors='replace') as f:
+                    collapse_perf(f, counts)
+            elif name.endswith('.cpuprofile'):
+                with io.open(path, encoding='utf-8', errors='replace') as f:
+                    collapse_cpuprofile(json.load(f), counts)
+    return counts
+
+
+def write(counts, directory, title):
+    """
+    Writes the collapsed stacks to directory/stacks.folded, the heaviest
+    first, and their flame graph to directory/flamegraph.svg
+    """
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    with io.open(
+            os.path.join(directory, 'stacks.folded'), 'w',
+            encoding='utf-8') as f:
+        for stack in sorted(counts, key=lambda s: (-counts[s], s)):
+            f.write(u'%s %d\n' % (stack, counts[stack]))
+    with io.open(
+            os.path.join(directory, 'flamegraph.svg'), 'w',
+            encoding='utf-8') as f:
+        f.write(u'%s' % flamegraph.svg(counts, title))
@@ -1,4 +1,14 @@
 from toolset.utils.output_helper import log
+from toolset.utils import scaling
+from toolset.utils import cgroup
+from toolset.utils import sampler
+from toolset.utils import hyperfine
+from toolset.utils import analysis
+from toolset.utils import cpu_scaling
+from toolset.utils import memory_search
+from toolset.utils.history import History, over_budget
+from toolset.utils.uploader import Uploader
+from toolset.utils.scheduler import Scheduler
 
 import os
 import subprocess
@@ -6,14 +16,18 @@ import uuid
 import time
 import json
 import threading
-import re
 import math
-import csv
+import bisect
+import operator
+from array import array
 from datetime import datetime
 
 # Cross-platform colored text
 from colorama import Fore, Style
 
+# Seconds over which the peak rates of the stats are taken
+PEAK_WINDOW = 1.0
+
 
 class Results:
 	def __init__(self, benchmarker):
@@ -29,6 +43,13 @@ class Results:
 		except OSError:
 			pass
 		self.file = os.path.join(self.directory, "results.json")
+		# Every intermediate update is appended here, results.json is only
+		# rewritten once the run is complete
+		self.journal = os.path.join(self.directory, "results.journal")
+		self.journal_offset = 0
+		self.uploader = None
+		# Tests running in scheduler slots report concurrently
+		self.lock = threading.RLock()
 
 		self.uuid = str(uuid.uuid4())
 		self.name = datetime.now().strftime(self.config.results_name)
@@ -44,21 +65,32 @@ class Results:
 		self.startTime = int(round(time.time() * 1000))
 		self.completionTime = None
 		self.generators = [t.name for t in benchmarker.tests]
+		# Generator versions read from the test images, see report_version
+		self.versions = dict()
 		self.duration = self.config.duration
+		self.concurrency = self.config.concurrency
 		self.rawData = dict()
-		self.rawData['build'] = dict()
 		self.completed = dict()
 		self.succeeded = dict()
-		self.succeeded['build'] = []
 		self.failed = dict()
-		self.failed['build'] = []
+		for test_type in self.config.types:
+			self.rawData[test_type] = dict()
+			self.succeeded[test_type] = []
+			self.failed[test_type] = []
 		self.verify = dict()
+		self.scaling = dict()
+		self.resourceUsage = dict()
+		self.cpuScaling = dict()
+		self.memory = dict()
+		self.analysis = dict()
+		self.history = dict()
+		self.readiness = dict()
 
 	#############################################################################
 	# PUBLIC FUNCTIONS
 	#############################################################################
 
-	def parse(self):
+	def parse(self, tests):
 		"""
 		Ensures that the system has all necessary software to run
 		the tests. This does not include that software for the individual
@@ -69,12 +101,75 @@ class Results:
 		self.__count_commits()
 		# Call the method which counts the sloc for each generator
 		self.__count_sloc()
+		# Fit the cost models of every generator over the corpus sizes
+		self.scaling = scaling.fit_all(self.rawData)
+		# Peak memory and parallel efficiency of every generator
+		self.resourceUsage = cgroup.summarize(self.rawData)
+		# Speedup and serial fraction over the cpu counts of the run
+		self.cpuScaling = cpu_scaling.summarize(self.rawData)
+		# Minimum viable memory and time-vs-memory curves
+		self.memory = memory_search.summarize(self.rawData)
+		# Confidence intervals and significance tests between generators
+		self.analysis = analysis.analyze(self.rawData, self.config.seed)
 
 		# Time to create parsed files
 		# Aggregate JSON file
 		with open(self.file, "w") as f:
 			f.write(json.dumps(self.__to_jsonable(), indent=2))
 
+	def check_history(self):
+		"""
+		Indexes these results into the results store and flags every
+		generator whose times moved beyond the noise band of its earlier
+		runs, or, with --compare, that differ significantly from the
+		baseline run. Returns True if a regression exceeds the --budget.
+		"""
+		self.__write_results()
+		store = History(self.config.results_root)
+		try:
+			store.index()
+			self.history = dict()
+			self.history['regressions'] = store.regressions(
+				self.config.timestamp)
+			findings = self.history['regressions']
+			if self.concurrency > 1:
+				self.history['interference'] = store.interference(
+					self.config.timestamp)
+			if self.config.compare is not None:
+				self.history['baseline'] = self.config.compare
+				self.history['comparison'] = store.compare(
+					self.config.timestamp, self.config.compare)
+				findings = self.history['comparison']
+		finally:
+			store.close()
+
+		for f in self.history.get('interference', []):
+			if f['change'] is not None:
+				log("%s %s (%s files of %s KB): %+.1f%% next to other tests"
+					% (f['generator'], f['testType'], f['fileNumber'],
+					   f['fileSize'], f['change'] * 100))
+		for f in findings:
+			if f['status'] != 'unchanged':
+				# No relative change against a baseline median of 0
+				log("%s %s (%s files of %s KB): %s%s" %
+					(f['generator'], f['testType'], f['fileNumber'],
+					 f['fileSize'], f['status'], ', %+.1f%%' %
+					 (f['change'] * 100) if f['change'] is not None else ''),
+					color=Fore.RED
+					if f['status'] == 'regression' else Fore.GREEN)
+
+		over = []
+		if self.config.budget is not None:
+			over = over_budget(findings, self.config.budget)
+			self.history['budget'] = self.config.budget
+			self.history['overBudget'] = over
+			if over:
+				log("%d regressions exceed the %s%% performance budget" %
+					(len(over), self.config.budget),
+					color=Fore.RED)
+		self.__write_results()
+		return len(over) > 0
+
 	def parse_test(self, generator_test, test_type):
 		"""
 		Parses the given test and test_type from the raw_file.
@@ -83,40 +178,46 @@ class Results:
 		results['results'] = []
 		stats = []
 
-		if os.path.exists(self.get_raw_file(generator_test.name, test_type)):
-			with open(self.get_raw_file(generator_test.name,
-										test_type)) as raw_data:
-
-				is_warmup = True
-				raw_data = None
-				for line in raw_data:
-					if "Warmup" in line or "Primer" in line:
-						is_warmup = True
-						continue
-					if not is_warmup:
-						if raw_data is None:
-							raw_data = dict()
-							results['results'].append(raw_data)
-						if "Latency" in line:
-							m = re.findall(r"([0-9]+\.*[0-9]*[us|ms|s|m|%]+)",
-										   line)
-							if len(m) == 4:
-								raw_data['latencyAvg'] = m[0]
-								raw_data['latencyStdev'] = m[1]
-								raw_data['latencyMax'] = m[2]
-						if "STARTTIME" in line:
-							m = re.search("[0-9]+", line)
-							raw_data["startTime"] = int(m.group(0))
-						if "ENDTIME" in line:
-							m = re.search("[0-9]+", line)
-							raw_data["endTime"] = int(m.group(0))
-							test_stats = self.__parse_stats(
-								generator_test, test_type,
-								raw_data["startTime"], raw_data["endTime"], 1)
-							stats.append(test_stats)
+		# Test types that time their own runs write one JSON result per line,
+		# the hyperfine script ends its output with hyperfine's JSON export
+		raw_file = self.get_raw_file(generator_test.name, test_type)
+		json_results = self.__parse_json_lines(raw_file)
+		if json_results:
+			results['results'] = json_results
+		elif os.path.exists(raw_file):
+			with open(raw_file) as raw_data:
+				output, snapshots = cgroup.parse(raw_data.read())
+			results['results'] = hyperfine.parse(output)
+			# The script takes a cgroup snapshot of the container the builds
+			# ran in between every two runs, and before and after them
+			usages = cgroup.chained_usages(snapshots)
+			for result in results['results']:
+				result['usage'] = usages
+
+		# The sampler brackets the whole run, test types that time their own
+		# runs also record the window of every run
+		stats_file = self.get_stats_file(generator_test.name, test_type)
+		if os.path.exists(stats_file):
+			columns = sampler.read_stats(stats_file)
+			stats.append(
+				self.__calculate_average_stats(
+					Results.__window(columns, 0, float('inf'), 1)))
+			for result in results['results']:
+				for run, (start, end) in enumerate(
+						result.get('windows') or []):
+					window_stats = self.__calculate_average_stats(
+						Results.__window(columns, start, end, 1))
+					window_stats.update({
+						'scenario': result.get('scenario'),
+						'run': run,
+						'startTime': start,
+						'endTime': end
+					})
+					stats.append(window_stats)
 		with open(
-				self.get_stats_file(generator_test.name, test_type) + ".json",
-				"w") as stats_file:
+				os.path.join(
+					self.get_test_type_dir(generator_test.name, test_type),
+					"stats.json"), "w") as stats_file:
 			json.dump(stats, stats_file, indent=2)
 
 		return results
@@ -125,19 +226,28 @@ class Results:
 		"""
 		Method meant to be run for a given timestamp
 		"""
-		for test_type in generator_test.runTests:
-			if os.path.exists(
-					self.get_raw_file(generator_test.name, test_type)):
-				results = self.parse_test(generator_test, test_type)
-				self.report_benchmark_results(generator_test, test_type,
-											  results['results'])
+		for (file_number, file_size, storage,
+			 cpus) in self.config.run_points():
+			self.config.file_number = file_number
+			self.config.file_size = file_size
+			self.config.storage = storage
+			self.config.cpus = cpus
+			for test_type in generator_test.runTests:
+				if os.path.exists(
+						self.get_raw_file(generator_test.name, test_type)):
+					results = self.parse_test(generator_test, test_type)
+					self.report_benchmark_results(generator_test, test_type,
+												  results['results'])
 
 	def write_intermediate(self, test_name, status_message):
 		"""
 		Writes the intermediate results for the given test_name and status_message
 		"""
-		self.completed[test_name] = status_message
-		self.__write_results()
+		self.__record({
+			'event': 'completed',
+			'test': test_name,
+			'status': status_message
+		})
 
 	def set_completion_time(self):
 		"""
@@ -146,27 +256,54 @@ class Results:
 		self.completionTime = int(round(time.time() * 1000))
 		self.__write_results()
 
-	def upload(self):
-		"""
-		Attempts to upload the results.json to the configured results_upload_uri
-		"""
-		if self.config.results_upload_uri is not None:
-			try:
-				requests.post(
-					self.config.results_upload_uri,
-					headers={'Content-Type': 'application/json'},
-					data=json.dumps(self.__to_jsonable(), indent=2))
-			except Exception:
-				log("Error uploading results.json")
+	def upload(self, final=False):
+		"""
+		Queues what was journaled since the last upload for the configured
+		results_upload_uri and returns at once, a background Uploader sends
+		it. The final upload adds the complete results.json and waits a
+		while for the queue to drain.
+		"""
+		if self.config.results_upload_uri is None:
+			return
+		with self.lock:
+			if self.uploader is None:
+				self.uploader = Uploader(self.config.results_upload_uri,
+										 self.directory, self.uuid)
+				self.uploader.start()
+			if final:
+				self.uploader.queue_results()
+				self.uploader.stop()
+				self.uploader = None
+			else:
+				self.uploader.notify()
 
 	def load(self):
 		"""
-		Load the results.json file
+		Load the results.json file, then replay the events of the journal
+		that are not applied yet. Only the journal written since the last
+		load is read.
 		"""
+		if self.journal_offset == 0:
+			try:
+				with open(self.file) as f:
+					self.__dict__.update(json.load(f))
+			except (ValueError, IOError):
+				pass
 		try:
-			with open(self.file) as f:
-				self.__dict__.update(json.load(f))
-		except (ValueError, IOError):
+			with open(self.journal, 'rb+') as journal:
+				journal.seek(self.journal_offset)
+				for line in journal:
+					# A crash may leave a partly written last event behind,
+					# drop it so that the next event starts on a fresh line
+					if not line.endswith(b'\n'):
+						journal.truncate(self.journal_offset)
+						break
+					self.journal_offset += len(line)
+					try:
+						self.__apply(json.loads(line.decode('utf-8')))
+					except ValueError:
+						pass
+		except IOError:
 			pass
 
 	def get_raw_file(self, test_name, test_type):
@@ -174,7 +311,8 @@ class Results:
 		Returns the output file for this test_name and test_type
 		Example: fw_root/results/timestamp/test_type/test_name/raw.txt
 		"""
-		path = os.path.join(self.directory, test_name, test_type, "raw.txt")
+		path = os.path.join(
+			self.get_test_type_dir(test_name, test_type), "raw.txt")
 		try:
 			os.makedirs(os.path.dirname(path))
 		except OSError:
@@ -184,15 +322,34 @@ class Results:
 	def get_stats_file(self, test_name, test_type):
 		"""
 		Returns the stats file name for this test_name and
-		Example: fw_root/results/timestamp/test_type/test_name/stats.txt
+		Example: fw_root/results/timestamp/test_type/test_name/stats.bin
 		"""
-		path = os.path.join(self.directory, test_name, test_type, "stats.txt")
+		path = os.path.join(
+			self.get_test_type_dir(test_name, test_type), "stats.bin")
 		try:
 			os.makedirs(os.path.dirname(path))
 		except OSError:
 			pass
 		return path
 
+	def get_test_type_dir(self, test_name, test_type):
+		"""
+		Returns the directory for this test_name and test_type. Scaling
+		sweeps get one subdirectory per corpus size, and storage profile
+		and cpu count if there are several.
+		Example: fw_root/results/timestamp/test_name/test_type/1000-10kb
+		"""
+		path = os.path.join(self.directory, test_name, test_type)
+		if len(self.config.run_points()) > 1:
+			point = "%s-%skb" % (self.config.file_number,
+								 self.config.file_size)
+			if self.config.storage:
+				point += "-%s" % self.config.storage
+			if self.config.cpus:
+				point += "-%dcpu" % self.config.cpus
+			path = os.path.join(path, point)
+		return path
+
 	def report_verify_results(self, generator_test, test_type, result):
 		"""
 		Used by GeneratorTest to add verification details to our results
@@ -200,9 +357,12 @@ class Results:
 		TODO: Technically this is an IPC violation - we are accessing
 		the parent process' memory from the child process
 		"""
-		if generator_test.name not in self.verify.keys():
-			self.verify[generator_test.name] = dict()
-		self.verify[generator_test.name][test_type] = result
+		self.__record({
+			'event': 'verify',
+			'test': generator_test.name,
+			'testType': test_type,
+			'result': result
+		})
 
 	def report_benchmark_results(self, generator_test, test_type, results):
 		"""
@@ -211,20 +371,51 @@ class Results:
 		TODO: Technically this is an IPC violation - we are accessing
 		the parent process' memory from the child process
 		"""
-		if test_type not in self.rawData.keys():
-			self.rawData[test_type] = dict()
-
-		# If results has a size from the parse, then it succeeded.
-		if results:
-			self.rawData[test_type][generator_test.name] = results
-
-			# This may already be set for single-tests
-			if generator_test.name not in self.succeeded[test_type]:
-				self.succeeded[test_type].append(generator_test.name)
-		else:
-			# This may already be set for single-tests
-			if generator_test.name not in self.failed[test_type]:
-				self.failed[test_type].append(generator_test.name)
+		for result in results:
+			result['fileNumber'] = self.config.file_number
+			result['fileSize'] = self.config.file_size
+			if self.config.storage:
+				result['storage'] = self.config.storage
+			if self.config.cpus:
+				result['cpus'] = self.config.cpus
+			if generator_test.slot is not None:
+				result['slot'] = Scheduler.describe(generator_test.slot)
+		self.__record({
+			'event': 'benchmark',
+			'test': generator_test.name,
+			'testType': test_type,
+			'fileNumber': self.config.file_number,
+			'fileSize': self.config.file_size,
+			'storage': self.config.storage,
+			'cpus': self.config.cpus,
+			'results': results
+		})
+
+	def report_readiness(self, generator_test, time_to_ready):
+		"""
+		Records how many seconds the server container of generator_test took
+		to get ready at the current corpus size, None if it never did
+		"""
+		self.__record({
+			'event': 'ready',
+			'test': generator_test.name,
+			'fileNumber': self.config.file_number,
+			'fileSize': self.config.file_size,
+			'storage': self.config.storage,
+			'cpus': self.config.cpus,
+			'timeToReady': time_to_ready
+		})
+
+	def report_version(self, generator_test, version):
+		"""
+		Records the version of the generator in the image of generator_test,
+		see GeneratorTest.get_version
+		"""
+		self.__record({
+			'event': 'version',
+			'test': generator_test.name,
+			'version': version
+		})
 
 	def finish(self):
 		"""
@@ -276,19 +467,123 @@ class Results:
 		to_ret['completionTime'] = self.completionTime
 		to_ret['generators'] = self.generators
 		to_ret['duration'] = self.duration
+		to_ret['concurrency'] = self.concurrency
 		to_ret['rawData'] = self.rawData
 		to_ret['completed'] = self.completed
 		to_ret['succeeded'] = self.succeeded
 		to_ret['failed'] = self.failed
 		to_ret['verify'] = self.verify
+		to_ret['scaling'] = self.scaling
+		to_ret['resourceUsage'] = self.resourceUsage
+		to_ret['cpuScaling'] = self.cpuScaling
+		to_ret['memory'] = self.memory
+		to_ret['analysis'] = self.analysis
+		to_ret['versions'] = self.versions
+		to_ret['history'] = self.history
+		to_ret['readiness'] = self.readiness
 
 		return to_ret
 
+	@staticmethod
+	def __parse_json_lines(raw_file):
+		"""
+		Returns the results of a raw file holding one JSON object per line,
+		or None if the raw file is in another format.
+		"""
+		results = []
+		try:
+			with open(raw_file) as raw_data:
+				for line in raw_data:
+					line = line.strip()
+					if not line:
+						continue
+					if not line.startswith('{'):
+						return None
+					results.append(json.loads(line))
+		except (IOError, ValueError):
+			return None
+		return results
+
+	def __record(self, event):
+		"""
+		Applies the event to these results and appends it to the journal.
+		The event is on disk before this returns, and the cost does not
+		grow with the size of the results.
+		"""
+		with self.lock:
+			self.__apply(event)
+			with open(self.journal, 'ab') as journal:
+				journal.write((json.dumps(event) + '\n').encode('utf-8'))
+				journal.flush()
+				os.fsync(journal.fileno())
+				self.journal_offset = journal.tell()
+
+	def __apply(self, event):
+		"""
+		Applies one journal event. Applying an event again leaves the
+		results unchanged, so replaying a journal over a results.json that
+		already holds some of its events is safe.
+		"""
+		kind = event.get('event')
+		if kind == 'completed':
+			self.completed[event['test']] = event['status']
+		elif kind == 'verify':
+			self.verify.setdefault(event['test'],
+								   dict())[event['testType']] = event['result']
+		elif kind == 'version':
+			self.versions[event['test']] = event['version']
+		elif kind == 'ready':
+			point = (event['fileNumber'], event['fileSize'],
+					 event.get('storage'), event.get('cpus'))
+			self.readiness[event['test']] = [
+				r for r in self.readiness.get(event['test'], [])
+				if (r['fileNumber'], r['fileSize'], r.get('storage'),
+					r.get('cpus')) != point
+			] + [dict((k, event.get(k)) for k in
+					  ('fileNumber', 'fileSize', 'storage', 'cpus',
+					   'timeToReady'))]
+		elif kind == 'benchmark':
+			test_type = event['testType']
+			name = event['test']
+			results = event['results']
+			if test_type not in self.rawData.keys():
+				self.rawData[test_type] = dict()
+			self.succeeded.setdefault(test_type, [])
+			self.failed.setdefault(test_type, [])
+
+			# If results has a size from the parse, then it succeeded.
+			if results:
+				point = (event['fileNumber'], event['fileSize'],
+						 event.get('storage'), event.get('cpus'))
+				# Sweeps report once per corpus size, storage profile and
+				# cpu count, keep the others
+				self.rawData[test_type][name] = [
+					r for r in self.rawData[test_type].get(name, [])
+					if (r.get('fileNumber'), r.get('fileSize'),
+						r.get('storage'), r.get('cpus')) != point
+				] + results
+
+				# This may already be set for single-tests
+				if name not in self.succeeded[test_type]:
+					self.succeeded[test_type].append(name)
+			else:
+				# This may already be set for single-tests
+				if name not in self.failed[test_type]:
+					self.failed[test_type].append(name)
+
 	def __write_results(self):
+		"""
+		Rewrites results.json as a whole. It is replaced atomically, so a
+		crash leaves either the old or the new file, and the journal holds
+		everything since.
+		"""
 		try:
-			with open(self.file, 'w') as f:
+			with open(self.file + '.tmp', 'w') as f:
 				f.write(json.dumps(self.__to_jsonable(), indent=2))
-		except IOError:
+				f.flush()
+				os.fsync(f.fileno())
+			os.rename(self.file + '.tmp', self.file)
+		except (IOError, OSError):
 			log("Error writing results.json")
 
 	def __count_sloc(self):
@@ -390,121 +685,119 @@ class Results:
 			shell=True,
 			cwd=self.config.fw_root).strip()
 
-	def __parse_stats(self, generator_test, test_type, start_time, end_time,
-					  interval):
+	@staticmethod
+	def __window(columns, start_time, end_time, interval):
 		"""
-		For each test type, process all the statistics, and return a multi-layered
-		dictionary that has a structure as follows:
-
-		(timestamp)
-		| (main header) - group that the stat is in
-		| | (sub header) - title of the stat
-		| | | (stat) - the stat itself, usually a floating point number
+		Returns every interval-th sample of the columns sampler.read_stats
+		read between start_time and end_time, as a dict of columns, each an
+		array of float64 values, with the sample times in the 'epoch'
+		column. See toolset/utils/sampler.py for the columns.
 		"""
-		stats_dict = dict()
-		stats_file = self.get_stats_file(generator_test.name, test_type)
-		with open(stats_file) as stats:
-			# dstat doesn't output a completely compliant CSV file - we need to strip the header
-			while stats.next() != "\n":
-				pass
-			stats_reader = csv.reader(stats)
-			main_header = stats_reader.next()
-			sub_header = stats_reader.next()
-			time_row = sub_header.index("epoch")
-			int_counter = 0
-			for row in stats_reader:
-				time = float(row[time_row])
-				int_counter += 1
-				if time < start_time:
-					continue
-				elif time > end_time:
-					return stats_dict
-				if int_counter % interval != 0:
-					continue
-				row_dict = dict()
-				for nextheader in main_header:
-					if nextheader != "":
-						row_dict[nextheader] = dict()
-				header = ""
-				for item_num, column in enumerate(row):
-					if len(main_header[item_num]) != 0:
-						header = main_header[item_num]
-					# all the stats are numbers, so we want to make sure that they stay that way in json
-					row_dict[header][sub_header[item_num]] = float(column)
-				stats_dict[time] = row_dict
-		return stats_dict
+		# Samples are in time order, so the window is found by bisection
+		first = bisect.bisect_left(columns['epoch'], start_time)
+		last = bisect.bisect_right(columns['epoch'], end_time)
+		if (first, last, interval) == (0, len(columns['epoch']), 1):
+			return columns
+		return dict((name, values[first:last:interval])
+					for name, values in columns.items())
 
 	def __calculate_average_stats(self, raw_stats):
 		"""
 		We have a large amount of raw data for the statistics that may be useful
 		for the stats nerds, but most people care about a couple of numbers. For
-		now, we're only going to supply:
-		  * Average CPU
-		  * Average Memory
-		  * Total network use
-		  * Total disk use
+		now, we're only going to supply the mean and peak of:
+		  * CPU usage
+		  * Memory usage
+		  * Network and disk throughput, plus the total bytes moved
+		  * CPU and memory usage of the generator container
 		More may be added in the future. If they are, please update the above list.
 
-		Note: raw_stats is directly from the __parse_stats method.
-
-		Recall that this consists of a dictionary of timestamps, each of which
-		contain a dictionary of stat categories which contain a dictionary of stats
-		"""
-		global main_header, display_stat
-		raw_stat_collection = dict()
-
-		for time_dict in raw_stats.items()[1]:
-			for main_header, sub_headers in time_dict.items():
-				item_to_append = None
-				if 'cpu' in main_header:
-					# We want to take the idl stat and subtract it from 100
-					# to get the time that the CPU is NOT idle.
-					item_to_append = sub_headers['idl'] - 100.0
-				elif main_header == 'memory usage':
-					item_to_append = sub_headers['used']
-				elif 'net' in main_header:
-					# Network stats have two parts - recieve and send. We'll use a tuple of
-					# style (recieve, send)
-					item_to_append = (sub_headers['recv'], sub_headers['send'])
-				elif 'dsk' or 'io' in main_header:
-					# Similar for network, except our tuple looks like (read, write)
-					item_to_append = (sub_headers['read'], sub_headers['writ'])
-				if item_to_append is not None:
-					if main_header not in raw_stat_collection:
-						raw_stat_collection[main_header] = list()
-					raw_stat_collection[main_header].append(item_to_append)
-
-		# Simple function to determine human readable size
-		# http://stackoverflow.com/questions/1094841/reusable-library-to-get-human-readable-version-of-file-size
-		def sizeof_fmt(num):
-			# We'll assume that any number we get is convertable to a float, just in case
-			num = float(num)
-			for x in ['bytes', 'KB', 'MB', 'GB']:
-				if 1024.0 > num > -1024.0:
-					return "%3.1f%s" % (num, x)
-				num /= 1024.0
-			return "%3.1f%s" % (num, 'TB')
-
-		# Now we have our raw stats in a readable format - we need to format it for display
-		# We need a floating point sum, so the built in sum doesn't cut it
+		Note: raw_stats is a window of the sampler columns, see __window.
+
+		The sampler stores cumulative counters, so means and totals over the
+		window only need its first and last samples. Peak rates are taken
+		over PEAK_WINDOW-long steps, and memory means weight every sample by
+		the time until the next one; each is a single pass over a column.
+		"""
+		epoch = raw_stats['epoch']
+		if len(epoch) < 2:
+			return dict()
+		duration = epoch[-1] - epoch[0]
+		# Runs shorter than PEAK_WINDOW are one step from end to end
+		step = min(len(epoch) - 1,
+				   max(1, int(round(PEAK_WINDOW * (len(epoch) - 1) /
+									duration))) if duration else 1)
+		steps = Results.__differences(epoch[::step])
+
+		def total(name):
+			return raw_stats[name][-1] - raw_stats[name][0]
+
+		def peak_rate(name):
+			rates = [
+				difference / elapsed for difference, elapsed in zip(
+					Results.__differences(raw_stats[name][::step]), steps)
+				if elapsed > 0
+			]
+			return max(rates) if rates else None
+
+		def mean(name):
+			values = raw_stats[name]
+			return math.fsum(
+				map(operator.mul, values[:-1],
+					Results.__differences(epoch))) / duration \
+				if duration else values[0]
+
+		busy = map(operator.add, raw_stats['cpu_user'][::step],
+				   raw_stats['cpu_system'][::step])
+		idle = map(operator.add, raw_stats['cpu_idle'][::step],
+				   raw_stats['cpu_iowait'][::step])
+		busy = Results.__differences(busy)
+		elapsed = list(
+			map(operator.add, busy, Results.__differences(idle)))
+		cpu_total = total('cpu_user') + total('cpu_system')
+		all_total = cpu_total + total('cpu_idle') + total('cpu_iowait')
+
 		display_stat_collection = dict()
-		for header, values in raw_stat_collection.items():
-			display_stat = None
-			if 'cpu' in header:
-				display_stat = sizeof_fmt(math.fsum(values) / len(values))
-			elif main_header == 'memory usage':
-				display_stat = sizeof_fmt(math.fsum(values) / len(values))
-			elif 'net' in main_header:
-				receive, send = zip(*values)  # unzip
-				display_stat = {
-					'receive': sizeof_fmt(math.fsum(receive)),
-					'send': sizeof_fmt(math.fsum(send))
-				}
-			else:  # if 'dsk' or 'io' in header:
-				read, write = zip(*values)  # unzip
-				display_stat = {
-					'read': sizeof_fmt(math.fsum(read)),
-					'write': sizeof_fmt(math.fsum(write))
-				}
-			display_stat_collection[header] = display_stat
-		return display_stat
+		display_stat_collection['duration'] = duration
+		display_stat_collection['samples'] = len(epoch)
+		display_stat_collection['cpu'] = {
+			'mean': 100.0 * cpu_total / all_total if all_total else 0.0,
+			'peak': 100.0 * max([b / e for b, e in zip(busy, elapsed) if e] or
+								[0.0])
+		}
+		display_stat_collection['memory'] = {
+			'mean': mean('mem_used'),
+			'peak': max(raw_stats['mem_used'])
+		}
+		display_stat_collection['net'] = {
+			'receive': total('net_recv'),
+			'send': total('net_send'),
+			'peakReceiveRate': peak_rate('net_recv'),
+			'peakSendRate': peak_rate('net_send')
+		}
+		display_stat_collection['disk'] = {
+			'read': total('disk_read'),
+			'write': total('disk_write'),
+			'peakReadRate': peak_rate('disk_read'),
+			'peakWriteRate': peak_rate('disk_write')
+		}
+		if raw_stats['cgroup_cpu'][0] >= 0:
+			cpu_peak = peak_rate('cgroup_cpu')
+			display_stat_collection['container'] = {
+				'cpuSeconds': total('cgroup_cpu') / 1e6,
+				'cpuMean': 100.0 * total('cgroup_cpu') / 1e6 / duration
+				if duration else 0.0,
+				'cpuPeak': 100.0 * cpu_peak / 1e6
+				if cpu_peak is not None else None,
+				'memoryMean': mean('cgroup_memory'),
+				'memoryPeak': max(raw_stats['cgroup_memory'])
+			}
+		return display_stat_collection
+
+	@staticmethod
+	def __differences(values):
+		"""
+		Returns the differences of neighbouring values as a list.
+		"""
+		values = values if isinstance(values, array) else array('d', values)
+		return list(map(operator.sub, values[1:], values[:-1]))
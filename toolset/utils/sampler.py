@@ -0,0 +1,279 @@
+import os
+import json
+import time
+import glob
+import struct
+import threading
+from array import array
+
+# Stats file layout: MAGIC, a little-endian u32 header length, a JSON header
+# with the column names, then rows of native-endian float64 values, one per
+# column.
+MAGIC = b'SSGBSTAT'
+
+# Every column holds the raw (mostly cumulative) counter value, rates are
+# derived when the file is read.
+COLUMNS = [
+    'epoch',  # seconds since the epoch
+    'cpu_user',  # jiffies, user + nice
+    'cpu_system',  # jiffies, system + irq + softirq
+    'cpu_idle',  # jiffies
+    'cpu_iowait',  # jiffies
+    'mem_used',  # bytes, MemTotal - MemAvailable
+    'disk_read',  # bytes
+    'disk_write',  # bytes
+    'net_recv',  # bytes, all interfaces but lo
+    'net_send',  # bytes, all interfaces but lo
+    'cgroup_cpu',  # microseconds of CPU used by the followed containers,
+                   # or -1
+    'cgroup_memory'  # bytes of memory used by the followed container, or -1
+]
+
+# Where the cgroup hierarchy of the docker host may be mounted: the ssgberk
+# script mounts it at /host/sys/fs/cgroup, as the toolset container's own
+# /sys/fs/cgroup only shows its own cgroup. The second one is for a toolset
+# run straight on the docker host.
+CGROUP_ROOTS = ['/host/sys/fs/cgroup', '/sys/fs/cgroup']
+
+# Where the cgroup of a container may live, relative to a cgroup root, for
+# cgroup v1 (cpu, memory) and v2 (unified)
+CGROUP_V1 = [('cpuacct/docker/%s/cpuacct.usage',
+              'memory/docker/%s/memory.usage_in_bytes')]
+CGROUP_V2 = ['system.slice/docker-%s.scope', 'docker/%s']
+
+
+class Sampler(threading.Thread):
+    """
+    Samples host-wide /proc counters, and the cgroup counters of the
+    container the build currently runs in (see follow), every `interval`
+    seconds into a preallocated ring buffer. Whenever the buffer is full,
+    and once stopped, its rows are appended to a compact binary stats
+    file. Readers are opened once and rewound on every sample, so a sample
+    costs a handful of read() calls.
+    """
+
+    def __init__(self, output_file, interval=0.05, capacity=4096):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.output_file = output_file
+        self.interval = interval
+        self.capacity = capacity
+        self.width = len(COLUMNS)
+        self.buffer = array('d', [0.0]) * (capacity * self.width)
+        self.rows = 0
+        self.stopped = threading.Event()
+
+        self.files = dict()
+        for name in ['stat', 'meminfo', 'diskstats', 'net/dev']:
+            self.files[name] = os.open('/proc/' + name, os.O_RDONLY)
+        # The container followed, the one follow() asked for, and the CPU
+        # time of the containers followed before it
+        self.cgroup_root = Sampler.__find_cgroup_root()
+        self.followed = None
+        self.following = None
+        self.cgroup_cpu_offset = 0.0
+        self.cgroup_cpu_last = 0.0
+        # Partitions are already counted in their disks, and device-mapper
+        # and md devices in the disks below them
+        self.disks = set(
+            d for d in os.listdir('/sys/block')
+            if not d.startswith(('loop', 'ram', 'dm-', 'md')))
+
+        header = json.dumps({'columns': COLUMNS}).encode('utf-8')
+        with open(self.output_file, 'wb') as f:
+            f.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def run(self):
+        next_sample = time.time()
+        while not self.stopped.is_set():
+            self.__sample()
+            next_sample += self.interval
+            self.stopped.wait(max(0, next_sample - time.time()))
+        self.__flush()
+        for fd in self.files.values():
+            os.close(fd)
+
+    def stop(self):
+        """
+        Stops sampling and blocks until every sample is on disk.
+        """
+        self.stopped.set()
+        self.join()
+
+    def follow(self, container_id):
+        """
+        Samples the cgroup counters of the given container from the next
+        sample on, the container the build runs in now. The CPU time column
+        stays cumulative over every container followed, the memory column
+        is that of the current one.
+        """
+        self.following = container_id
+
+    ##########################################################################################
+    # Private methods
+    ##########################################################################################
+
+    def __read(self, name):
+        fd = self.files.get(name)
+        if fd is None:
+            return None
+        try:
+            os.lseek(fd, 0, os.SEEK_SET)
+            return os.read(fd, 65536).decode('ascii', 'replace')
+        except OSError:
+            # The cgroup of a container that is gone
+            return None
+
+    def __sample(self):
+        row = self.rows * self.width
+        values = self.buffer
+        values[row] = time.time()
+
+        cpu = self.__read('stat').split('\n', 1)[0].split()
+        values[row + 1] = float(cpu[1]) + float(cpu[2])
+        values[row + 2] = float(cpu[3]) + float(cpu[6]) + float(cpu[7])
+        values[row + 3] = float(cpu[4])
+        values[row + 4] = float(cpu[5])
+
+        meminfo = dict()
+        for line in self.__read('meminfo').splitlines()[:3]:
+            key, value = line.split(':')
+            meminfo[key] = float(value.split()[0]) * 1024
+        values[row + 5] = meminfo['MemTotal'] - meminfo.get(
+            'MemAvailable', meminfo['MemFree'])
+
+        read = written = 0.0
+        for line in self.__read('diskstats').splitlines():
+            fields = line.split()
+            if fields[2] not in self.disks:
+                continue
+            read += float(fields[5])
+            written += float(fields[9])
+        values[row + 6] = read * 512
+        values[row + 7] = written * 512
+
+        received = sent = 0.0
+        for line in self.__read('net/dev').splitlines()[2:]:
+            interface, counters = line.split(':', 1)
+            if interface.strip() == 'lo':
+                continue
+            counters = counters.split()
+            received += float(counters[0])
+            sent += float(counters[8])
+        values[row + 8] = received
+        values[row + 9] = sent
+
+        if self.following != self.followed:
+            self.__switch_cgroup()
+        if self.cgroup_root is None:
+            values[row + 10] = values[row + 11] = -1.0
+        else:
+            cgroup_cpu = Sampler.__cgroup_cpu(self.__read('cgroup_cpu'))
+            if cgroup_cpu >= 0:
+                self.cgroup_cpu_last = cgroup_cpu
+            values[row + 10] = self.cgroup_cpu_offset + self.cgroup_cpu_last
+            cgroup_memory = self.__read('cgroup_memory')
+            values[row + 11] = float(cgroup_memory) if cgroup_memory \
+                else 0.0
+
+        self.rows += 1
+        if self.rows == self.capacity:
+            self.__flush()
+
+    def __switch_cgroup(self):
+        """
+        Opens the cgroup files of the container to follow in place of those
+        of the container followed so far
+        """
+        for name in ('cgroup_cpu', 'cgroup_memory'):
+            fd = self.files.pop(name, None)
+            if fd is not None:
+                os.close(fd)
+        self.cgroup_cpu_offset += self.cgroup_cpu_last
+        self.cgroup_cpu_last = 0.0
+        self.followed = self.following
+        if self.cgroup_root is None:
+            return
+        for name, path in Sampler.__find_cgroup(self.cgroup_root,
+                                                self.followed).items():
+            try:
+                self.files[name] = os.open(path, os.O_RDONLY)
+            except OSError:
+                pass
+
+    def __flush(self):
+        with open(self.output_file, 'ab') as f:
+            self.buffer[:self.rows * self.width].tofile(f)
+        self.rows = 0
+
+    @staticmethod
+    def __cgroup_cpu(text):
+        if not text:
+            return -1.0
+        if text.startswith('usage_usec'):
+            # cgroup v2 cpu.stat
+            return float(text.split('\n', 1)[0].split()[1])
+        # cgroup v1 cpuacct.usage is in nanoseconds
+        return float(text) / 1000
+
+    @staticmethod
+    def __find_cgroup_root():
+        """
+        Returns the first of CGROUP_ROOTS that holds the cgroups of docker
+        containers, or None if none is visible from here
+        """
+        for root in CGROUP_ROOTS:
+            for pattern in [cpu for cpu, _ in CGROUP_V1] + CGROUP_V2:
+                parent = os.path.dirname(pattern.split('%s')[0])
+                if parent and os.path.isdir(os.path.join(root, parent)):
+                    return root
+        return None
+
+    @staticmethod
+    def __find_cgroup(root, container_id):
+        """
+        Returns the cgroup files of the container under the cgroup root.
+        """
+        if not container_id:
+            return dict()
+        for cpu, memory in CGROUP_V1:
+            pattern = os.path.join(root, cpu % (container_id + '*'))
+            for found in glob.glob(pattern):
+                directory = os.path.dirname(found)
+                return {
+                    'cgroup_cpu': found,
+                    'cgroup_memory': os.path.join(
+                        root, memory % os.path.basename(directory))
+                }
+        for pattern in CGROUP_V2:
+            pattern = os.path.join(root, pattern % (container_id + '*'))
+            for directory in glob.glob(pattern):
+                return {
+                    'cgroup_cpu': os.path.join(directory, 'cpu.stat'),
+                    'cgroup_memory': os.path.join(directory, 'memory.current')
+                }
+        return dict()
+
+
+def read_stats(stats_file):
+    """
+    Reads a stats file written by a Sampler. Returns a dict mapping every
+    column name to an array of float64 samples.
+    """
+    with open(stats_file, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("Not a stats file: %s" % stats_file)
+        (length, ) = struct.unpack('<I', f.read(4))
+        columns = json.loads(f.read(length).decode('utf-8'))['columns']
+        values = array('d')
+        try:
+            values.frombytes(f.read())
+        except AttributeError:
+            # Python 2
+            values.fromstring(f.read())
+    width = len(columns)
+    return dict((name, values[i::width]) for i, name in enumerate(columns))
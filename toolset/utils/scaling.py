@@ -0,0 +1,158 @@
+from toolset.utils import analysis
+
+# A growth exponent above this marks a generator whose build time grows
+# faster than the number of pages.
+SUPERLINEAR_EXPONENT = 1.1
+
+# Range and resolution of the growth exponent search
+MIN_EXPONENT = 0.5
+MAX_EXPONENT = 3.0
+EXPONENT_STEPS = 250
+
+
+def least_squares(rows, targets):
+    """
+    Solves the normal equations for rows * coefficients = targets and returns
+    the coefficients, or None when the system is singular.
+    """
+    size = len(rows[0])
+    # Augmented normal matrix [A'A | A'b]
+    matrix = [[sum(r[i] * r[j] for r in rows) for j in range(size)] +
+              [sum(r[i] * t for r, t in zip(rows, targets))]
+              for i in range(size)]
+
+    # Gauss-Jordan elimination with partial pivoting
+    for col in range(size):
+        pivot = max(range(col, size), key=lambda r: abs(matrix[r][col]))
+        if abs(matrix[pivot][col]) < 1e-12:
+            return None
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        for row in range(size):
+            if row != col:
+                factor = matrix[row][col] / matrix[col][col]
+                matrix[row] = [a - factor * b
+                               for a, b in zip(matrix[row], matrix[col])]
+    return [matrix[i][size] / matrix[i][i] for i in range(size)]
+
+
+def growth_exponent(points):
+    """
+    Returns the exponent k that best fits seconds = a + c * pages ** k to a
+    list of (pages, seconds) points. For a fixed k the model is linear, so
+    this simply scans k and keeps the smallest residual.
+    """
+    best = None
+    for step in range(EXPONENT_STEPS + 1):
+        k = MIN_EXPONENT + (MAX_EXPONENT - MIN_EXPONENT) * step / float(
+            EXPONENT_STEPS)
+        rows = [[1.0, n ** k] for n, _ in points]
+        coefficients = least_squares(rows, [t for _, t in points])
+        if coefficients is None or coefficients[1] <= 0:
+            continue
+        residual = sum((t - coefficients[0] - coefficients[1] * row[1]) ** 2
+                       for (_, t), row in zip(points, rows))
+        if best is None or residual < best[0]:
+            best = (residual, k)
+    return best[1] if best else None
+
+
+def fit(points):
+    """
+    Fits a cost model to a list of (file_number, file_size, seconds) points
+    of a single generator:
+
+        seconds = fixedOverhead + perPage * file_number
+                  + perPageKB * file_number * file_size
+
+    With three or more file numbers of one size the growth exponent k of
+    seconds = a + c * file_number ** k is estimated as well, so 1 means
+    linear and anything above SUPERLINEAR_EXPONENT is reported as
+    superlinear.
+
+    Returns None if the points cannot support a model.
+    """
+    numbers = set(p[0] for p in points)
+    sizes = set(p[1] for p in points)
+    if len(numbers) < 2:
+        return None
+
+    if len(sizes) > 1:
+        rows = [[1.0, float(n), float(n * s)] for n, s, _ in points]
+    else:
+        rows = [[1.0, float(n)] for n, s, _ in points]
+    coefficients = least_squares(rows, [float(t) for _, _, t in points])
+    if coefficients is None:
+        return None
+
+    overhead = coefficients[0]
+    per_page = coefficients[1]
+    per_page_kb = coefficients[2] if len(coefficients) > 2 else None
+
+    predictions = [sum(c * x for c, x in zip(coefficients, row))
+                   for row in rows]
+    mean = sum(t for _, _, t in points) / float(len(points))
+    total = sum((t - mean) ** 2 for _, _, t in points)
+    residual = sum((t - p) ** 2 for (_, _, t), p in zip(points, predictions))
+
+    # The exponent is taken over the file size with the most file numbers
+    size = max(sizes, key=lambda s: len(set(p[0] for p in points if p[1] == s)))
+    curve = [(float(n), float(t)) for n, s, t in points if s == size]
+    exponent = None
+    if len(set(n for n, _ in curve)) > 2:
+        exponent = growth_exponent(curve)
+
+    return {
+        'fixedOverhead': overhead,
+        'perPage': per_page,
+        'perPageKB': per_page_kb,
+        'rSquared': 1.0 - residual / total if total else 1.0,
+        'exponent': exponent,
+        'superlinear': exponent is not None
+        and exponent > SUPERLINEAR_EXPONENT,
+        'points': len(points)
+    }
+
+
+def seconds(result):
+    """
+    Returns the time of one build of a rawData result: the median of its
+    per-iteration times, else its summary median or mean. None if it has
+    none.
+    """
+    if result.get('times'):
+        return analysis.median(sorted(result['times']))
+    for key in ('median', 'mean'):
+        if result.get(key) is not None:
+            return result[key]
+    return None
+
+
+def fit_all(raw_data):
+    """
+    Fits a cost model per test type and generator from results.json rawData.
+    Every successful result that carries fileNumber, fileSize and a build
+    time, see seconds(), contributes one point to the curve of its series,
+    see analysis.series.
+    """
+    models = dict()
+    for test_type, generators in raw_data.items():
+        if not isinstance(generators, dict):
+            continue
+        for name, results in generators.items():
+            if not isinstance(results, list):
+                continue
+            curves = dict()
+            for r in results:
+                if not isinstance(r, dict) or r.get('failed') or \
+                        'fileNumber' not in r or 'fileSize' not in r:
+                    continue
+                time = seconds(r)
+                if time is not None:
+                    key = analysis.series(test_type, r)
+                    curves.setdefault(key, []).append(
+                        (r['fileNumber'], r['fileSize'], time))
+            for key, points in curves.items():
+                model = fit(points)
+                if model is not None:
+                    models.setdefault(key, dict())[name] = model
+    return models
@@ -0,0 +1,311 @@
+import os
+import glob
+import ctypes
+import ctypes.util
+import threading
+
+try:
+    from Queue import Queue
+except ImportError:
+    from queue import Queue
+
+from toolset.utils.output_helper import log
+
+
+def topology():
+    """
+    Returns the online logical CPUs of this machine as (package, core, cpu)
+    tuples, read from sysfs. Hyperthreads of one core share package and
+    core.
+    """
+    cpus = []
+    for path in glob.glob('/sys/devices/system/cpu/cpu[0-9]*'):
+        cpu = int(os.path.basename(path)[3:])
+        try:
+            with open(os.path.join(path, 'online')) as f:
+                if f.read().strip() == '0':
+                    continue
+        except IOError:
+            # cpu0 usually cannot go offline and has no `online` file
+            pass
+        try:
+            with open(os.path.join(path, 'topology',
+                                   'physical_package_id')) as f:
+                package = int(f.read())
+            with open(os.path.join(path, 'topology', 'core_id')) as f:
+                core = int(f.read())
+        except (IOError, ValueError):
+            package, core = 0, cpu
+        cpus.append((package, core, cpu))
+    return sorted(cpus)
+
+
+def cpuset(cpus):
+    """
+    Formats CPU numbers the way cpuset_cpus expects them, e.g. "0-3,8".
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and ranges[-1][1] == cpu - 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(
+        str(a) if a == b else '%d-%d' % (a, b) for a, b in ranges)
+
+
+def parse_cpuset(text):
+    """
+    Returns the CPU numbers of a cpuset like "0-3,8", the inverse of
+    cpuset().
+    """
+    cpus = []
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part.strip():
+            cpus.append(int(part))
+    return cpus
+
+
+def _libc_mask(cpus=()):
+    """
+    Returns a cpu_set_t of the C library holding the given CPU numbers
+    """
+    bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    mask = (ctypes.c_ulong * (1024 // bits))()
+    for cpu in cpus:
+        mask[cpu // bits] |= 1 << (cpu % bits)
+    return mask
+
+
+def pin(cpus):
+    """
+    Confines the calling thread, and the processes it starts from then on,
+    to the given CPU numbers. Other threads of the toolset are left alone.
+    """
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cpus)
+        return
+    # Python 2 has no binding, glibc's applies to the calling thread too
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    mask = _libc_mask(cpus)
+    if libc.sched_setaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)):
+        raise OSError(ctypes.get_errno(), "sched_setaffinity failed")
+
+
+def allowed():
+    """
+    Returns the CPU numbers the calling thread may run on.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    mask = _libc_mask()
+    if libc.sched_getaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)):
+        raise OSError(ctypes.get_errno(), "sched_getaffinity failed")
+    bits = 8 * ctypes.sizeof(ctypes.c_ulong)
+    return [cpu for cpu in range(len(mask) * bits)
+            if mask[cpu // bits] >> (cpu % bits) & 1]
+
+
+def cores(cpus):
+    """
+    Groups (package, core, cpu) tuples by physical core, in package order.
+    Returns a list of (package, core) and CPU list pairs.
+    """
+    result = []
+    for package, core, cpu in sorted(cpus):
+        if result and result[-1][0] == (package, core):
+            result[-1][1].append(cpu)
+        else:
+            result.append(((package, core), [cpu]))
+    return result
+
+
+def reserve(cpus, count):
+    """
+    Sets the last count physical cores of (package, core, cpu) tuples apart.
+    Returns the remaining tuples and the CPUs of the reserved cores.
+    """
+    if count <= 0:
+        return cpus, []
+    grouped = cores(cpus)
+    if count >= len(grouped):
+        raise ValueError("Cannot reserve %d of %d cores" %
+                         (count, len(grouped)))
+    reserved = set(cpu for _, threads in grouped[-count:] for cpu in threads)
+    return ([c for c in cpus if c[2] not in reserved], sorted(reserved))
+
+
+def partition(cpus, slots):
+    """
+    Splits (package, core, cpu) tuples into slots non-overlapping CPU sets
+    of whole physical cores, so that no two slots share a core's
+    hyperthreads. Cores are dealt out in package order, which keeps a slot
+    on one package whenever the slots fit. The first slots get the extra
+    cores of an uneven split.
+    """
+    grouped = cores(cpus)
+    if slots > len(grouped):
+        raise ValueError("Cannot run %d tests at once on %d cores" %
+                         (slots, len(grouped)))
+    sets = []
+    start = 0
+    for i in range(slots):
+        size = len(grouped) // slots + (1 if i < len(grouped) % slots else 0)
+        sets.append(
+            sorted(cpu for _, threads in grouped[start:start + size]
+                   for cpu in threads))
+        start += size
+    return sets
+
+
+def spread(cpus, count):
+    """
+    Picks count CPUs of (package, core, cpu) tuples, one per physical core
+    before any second hyperthread of a core, so that two CPUs are two
+    cores wherever possible. Returns the CPU numbers.
+    """
+    if count > len(cpus):
+        raise ValueError("Cannot pick %d of %d cpus" % (count, len(cpus)))
+    grouped = [threads for _, threads in cores(cpus)]
+    picked = []
+    depth = 0
+    while len(picked) < count:
+        for threads in grouped:
+            if depth < len(threads) and len(picked) < count:
+                picked.append(threads[depth])
+        depth += 1
+    return sorted(picked)
+
+
+class Scheduler:
+    """
+    Runs generator tests concurrently, each in a slot of its own: a
+    dedicated set of physical cores and a memory limit that every container
+    of the test is started with (see DockerHelper). A slot runs one test at
+    a time, and the next test waits for the first free slot. Every slot
+    records the tests that ran next to its current one, so that results can
+    report their neighbours. docker_info is the `docker info` of the
+    server.
+
+    With `build_cores`, the last physical cores are kept out of every slot
+    for the BuildPipeline, and a single slot pins even a one-at-a-time run
+    to the remaining cores.
+
+    With `cpus` set, a CPU scaling run, containers only get that many CPUs
+    of their slot, or of the machine without slots, see limit_cpus().
+    """
+
+    def __init__(self, config, docker_info):
+        self.config = config
+        self.lock = threading.Lock()
+        self.running = dict()
+        self.slots = []
+        self.reserved = None
+        self.cpus = []
+
+        if docker_info is None:
+            return
+        if config.server_docker_host.startswith('unix://'):
+            cpus = topology()
+        else:
+            # The CPU layout of a remote docker host is unknown
+            cpus = [(0, cpu, cpu) for cpu in range(docker_info['NCPU'])]
+        cpus, reserved = reserve(cpus, config.build_cores)
+        self.cpus = cpus
+        if config.concurrency <= 1 and not config.build_cores:
+            return
+        if reserved:
+            self.reserved = cpuset(reserved)
+            log("Reserved cpus %s for background builds" % self.reserved)
+        memory = config.slot_memory * 1024 * 1024 or \
+            docker_info['MemTotal'] // config.concurrency
+        for index, cpu_list in enumerate(
+                partition(cpus, config.concurrency)):
+            self.slots.append({
+                'index': index,
+                'topology': [c for c in cpus if c[2] in cpu_list],
+                'cpuset': cpuset(cpu_list),
+                'cpus': len(cpu_list),
+                'memLimit': memory,
+                'concurrency': config.concurrency,
+                'neighbors': set()
+            })
+            log("Slot %d: cpus %s, %d MB of memory" %
+                (index, self.slots[-1]['cpuset'], memory // (1024 * 1024)))
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def run(self, tests, function):
+        """
+        Calls function(test) for every test, on as many threads as there are
+        slots, with test.slot set to the slot it runs in. Returns the
+        results of the calls in the order of tests.
+        """
+        if not self.slots:
+            return [function(test) for test in tests]
+
+        free = Queue()
+        for slot in self.slots:
+            free.put(slot)
+        results = [None] * len(tests)
+
+        def run_test(index, test, slot):
+            try:
+                results[index] = function(test)
+            finally:
+                with self.lock:
+                    del self.running[slot['index']]
+                test.slot = None
+                free.put(slot)
+
+        threads = []
+        for index, test in enumerate(tests):
+            slot = free.get()
+            with self.lock:
+                slot['neighbors'] = set(
+                    t.name for t in self.running.values())
+                for other in self.running.values():
+                    other.slot['neighbors'].add(test.name)
+                self.running[slot['index']] = test
+                test.slot = slot
+            thread = threading.Thread(
+                target=run_test, args=(index, test, slot))
+            thread.daemon = True
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        return results
+
+    def limit_cpus(self, slot):
+        """
+        Returns the cpuset of the current CPU count of a scaling run within
+        slot, or within the machine when slot is None. None when the run
+        does not limit CPUs.
+        """
+        if not self.config.cpus:
+            return None
+        cpus = slot['topology'] if slot is not None else self.cpus
+        return cpuset(spread(cpus, self.config.cpus))
+
+    @staticmethod
+    def describe(slot):
+        """
+        Returns the JSON description of a slot for the results.
+        """
+        if slot is None:
+            return None
+        return {
+            'index': slot['index'],
+            'cpuset': slot['cpuset'],
+            'cpus': slot['cpus'],
+            'memLimit': slot['memLimit'],
+            'concurrency': slot['concurrency'],
+            'neighbors': sorted(slot['neighbors'])
+        }
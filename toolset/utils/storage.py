@@ -0,0 +1,99 @@
+import re
+
+from docker.types import Mount
+
+# Storage profiles, see --storage. overlay is what docker does by default:
+# every write goes to the container's overlay filesystem.
+PROFILES = ['overlay', 'tmpfs', 'bind', 'throttled']
+
+# Where the storage of a profile is mounted in the container, the content
+# and output directories are bind-mounted onto it from there
+MOUNT = '/ssgberk-storage'
+
+# Marks the line with the seconds the set-up script took in its output
+SETUP_MARKER = 'ssgberk-storage-setup'
+
+# Prints the host block device of MOUNT as /dev/<disk>, the whole disk for a
+# partition. Only needs a POSIX shell, awk and readlink; sysfs is the host's
+# in a privileged container.
+DEVICE_SCRIPT = r'''
+dev=$(awk '$5 == "@MOUNT@" {print $3}' /proc/self/mountinfo)
+path=$(readlink -f /sys/dev/block/$dev) || exit 1
+[ -f $path/partition ] && path=${path%/*}
+echo /dev/${path##*/}
+'''.replace('@MOUNT@', MOUNT)
+
+
+def options(profile, device=None, rate=None, iops=None):
+    """
+    Returns the containers.run arguments of a storage profile. tmpfs
+    mounts a tmpfs, whose pages count against the container's memory
+    limit. bind mounts an anonymous volume, a host directory that is
+    removed with the container. throttled is bind on a device throttled to
+    rate bytes and iops operations per second each way.
+    """
+    if profile in (None, 'overlay'):
+        return dict()
+    if profile == 'tmpfs':
+        return {'tmpfs': {MOUNT: 'rw,exec,nosuid,nodev'}}
+    result = {'mounts': [Mount(MOUNT, None, type='volume')]}
+    if profile == 'throttled':
+        result.update({
+            'device_read_bps': [{'Path': device, 'Rate': rate}],
+            'device_write_bps': [{'Path': device, 'Rate': rate}],
+            'device_read_iops': [{'Path': device, 'Rate': iops}],
+            'device_write_iops': [{'Path': device, 'Rate': iops}]
+        })
+    return result
+
+
+def script(profile, directories):
+    """
+    Returns the shell script that moves the given directories, relative
+    to the working directory of the container, onto the profile's storage.
+    Their contents are copied over and the storage is bind-mounted in
+    their place, which needs a privileged container. The script ends by
+    printing how long it took, see parse_setup. Empty for overlay.
+    """
+    if profile in (None, 'overlay'):
+        return ''
+    lines = ["ssgberk_storage_start=$(cut -d ' ' -f 1 /proc/uptime)"]
+    for index, directory in enumerate(directories):
+        directory = directory.strip('/')
+        if not directory or re.search(r"['\s]", directory):
+            continue
+        target = '%s/%d' % (MOUNT, index)
+        lines.append(
+            "mkdir -p %s '%s' && cp -a '%s/.' %s/ && "
+            "mount --bind %s '%s' || exit 1" %
+            (target, directory, directory, target, target, directory))
+    lines.append("awk -v start=$ssgberk_storage_start "
+                 "'{print \"%s\", $1 - start}' /proc/uptime" % SETUP_MARKER)
+    return '\n'.join(lines)
+
+
+def parse_setup(output):
+    """
+    Splits the output of a container that ran a set-up script into the
+    rest of the output and the seconds the set-up took, 0 without one.
+    """
+    lines = []
+    seconds = 0.0
+    for line in output.splitlines():
+        m = re.match(r'^%s ([0-9.e+-]+)$' % SETUP_MARKER, line.strip())
+        if m:
+            seconds += float(m.group(1))
+        else:
+            lines.append(line)
+    return '\n'.join(lines), seconds
+
+
+def parse_device(output):
+    """
+    Returns the device printed by DEVICE_SCRIPT, or None.
+    """
+    for line in output.splitlines():
+        line = line.strip()
+        if re.match(r'^/dev/[^/\s]+$', line):
+            return line
+    return None
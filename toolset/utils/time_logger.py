@@ -1,13 +1,15 @@
 import time
+import threading
 from colorama import Fore
 
 from toolset.utils.output_helper import log
 
 
-class TimeLogger:
+class TimeLogger(threading.local):
     """
     Class for keeping track of and logging execution times
-    for suite actions
+    for suite actions. Every thread keeps its own times, so that tests
+    running concurrently in scheduler slots do not mix them up.
     """
 
     def __init__(self):
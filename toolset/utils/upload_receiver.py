@@ -0,0 +1,97 @@
+import os
+import gzip
+import json
+import random
+import argparse
+import threading
+from io import BytesIO
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+
+class UploadReceiver(HTTPServer):
+    """
+    A stand-in for the results server, for trying out and testing the
+    Uploader without the real thing. Rebuilds every uploaded run under
+    <directory>/<timestamp>: deltas are appended to results.journal in
+    journal order, a delta it already has is acknowledged and dropped, and
+    complete results replace results.json. fail_rate is the fraction of
+    requests answered with a 503, to exercise the retries.
+    """
+
+    def __init__(self, address, directory, fail_rate=0.0):
+        HTTPServer.__init__(self, address, UploadHandler)
+        self.directory = directory
+        self.fail_rate = fail_rate
+        self.lock = threading.Lock()
+
+    def receive(self, headers, body):
+        """
+        Stores one upload. Returns the HTTP status to answer with.
+        """
+        if random.random() < self.fail_rate:
+            return 503
+        timestamp = os.path.basename(headers.get('X-Ssgberk-Timestamp', ''))
+        if not timestamp:
+            return 400
+        if headers.get('Content-Encoding') == 'gzip':
+            body = gzip.GzipFile(fileobj=BytesIO(body)).read()
+        run = os.path.join(self.directory, timestamp)
+        with self.lock:
+            if not os.path.isdir(run):
+                os.makedirs(run)
+            if headers.get('X-Ssgberk-Kind') == 'results':
+                json.loads(body.decode('utf-8'))
+                with open(os.path.join(run, 'results.json'), 'wb') as f:
+                    f.write(body)
+                return 200
+            journal = os.path.join(run, 'results.journal')
+            length = os.path.getsize(journal) \
+                if os.path.exists(journal) else 0
+            offset = int(headers.get('X-Ssgberk-Offset', 0))
+            if offset > length:
+                # A delta before this one is missing
+                return 409
+            if offset + len(body) > length:
+                with open(journal, 'ab') as f:
+                    f.write(body[length - offset:])
+            return 200
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            status = self.server.receive(self.headers, body)
+        except (IOError, ValueError):
+            status = 400
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Receives results uploads, see toolset/utils/uploader.py')
+    parser.add_argument('--port', default=8765, type=int)
+    parser.add_argument('--directory', default='uploads')
+    parser.add_argument(
+        '--fail-rate',
+        default=0.0,
+        type=float,
+        help='Fraction of uploads to reject, to exercise the retries')
+    args = parser.parse_args()
+    UploadReceiver(('', args.port), args.directory,
+                   args.fail_rate).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+import os
+import gzip
+import time
+import random
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from toolset.utils.output_helper import log
+
+# Seconds before the first retry of a failed upload, doubled on every
+# further failure up to MAX_BACKOFF
+INITIAL_BACKOFF = 1.0
+MAX_BACKOFF = 300.0
+
+# Seconds a single request may take
+REQUEST_TIMEOUT = 30
+
+# Seconds stop() waits for the queue to drain, whatever is left stays queued
+# on disk and is sent by the next uploader of the same results directory
+DRAIN_TIMEOUT = 60
+
+# Largest journal delta packed into one upload
+MAX_DELTA = 4 * 1024 * 1024
+
+
+class Uploader(threading.Thread):
+    """
+    Uploads a results directory to a results_upload_uri in the background.
+
+    Every notify() packs the results journal written since the last queued
+    byte into a gzip-compressed delta in an on-disk queue
+    (<results>/upload-queue). The thread sends the queue in order over one
+    keep-alive connection and deletes each file once the receiver
+    acknowledged it with a 2xx, retrying failures with exponential backoff.
+    Deltas carry their journal offset, so a receiver can drop one it already
+    has. queue_results() queues the complete results.json the same way.
+    """
+
+    def __init__(self, uri, directory, uuid):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.uri = uri
+        self.uuid = uuid
+        self.journal = os.path.join(directory, 'results.journal')
+        self.results_file = os.path.join(directory, 'results.json')
+        self.timestamp = os.path.basename(os.path.normpath(directory))
+        self.queue = os.path.join(directory, 'upload-queue')
+        self.queued_file = os.path.join(self.queue, 'queued')
+        if not os.path.isdir(self.queue):
+            os.makedirs(self.queue)
+
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(pool_maxsize=1))
+        self.session.mount('https://', HTTPAdapter(pool_maxsize=1))
+
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.failures = 0
+        self.retry_at = 0
+
+    ##########################################################################################
+    # Public methods
+    ##########################################################################################
+
+    def notify(self):
+        """
+        Queues the journal written since the last call and wakes the thread.
+        Never blocks on the network.
+        """
+        with self.lock:
+            self.__queue_journal()
+        self.wake.set()
+
+    def queue_results(self):
+        """
+        Queues the complete results.json, after every journal delta.
+        """
+        with self.lock:
+            offset = self.__queue_journal()
+            with open(self.results_file, 'rb') as f:
+                self.__write('%016d.results.gz' % offset, f.read())
+        self.wake.set()
+
+    def run(self):
+        while True:
+            self.wake.clear()
+            if time.time() >= self.retry_at:
+                self.__send_queue()
+            if self.stopped.is_set() and not self.__pending():
+                break
+            self.wake.wait(max(0.0, self.retry_at - time.time())
+                           if self.failures else None)
+        self.session.close()
+
+    def stop(self, timeout=DRAIN_TIMEOUT):
+        """
+        Waits up to timeout seconds for the queue to be sent.
+        """
+        self.stopped.set()
+        self.wake.set()
+        self.join(timeout)
+        pending = len(self.__pending())
+        if pending:
+            log("%d results uploads are still queued in %s" %
+                (pending, self.queue))
+
+    ##########################################################################################
+    # Private methods
+    ##########################################################################################
+
+    def __pending(self):
+        return sorted(
+            name for name in os.listdir(self.queue) if name.endswith('.gz'))
+
+    def __queue_journal(self):
+        """
+        Packs the complete journal events after the last queued byte into
+        queue files. Returns the journal offset queued up to.
+        """
+        try:
+            with open(self.queued_file) as f:
+                offset = int(f.read())
+        except (IOError, ValueError):
+            offset = 0
+        try:
+            with open(self.journal, 'rb') as journal:
+                journal.seek(offset)
+                delta = journal.read()
+        except IOError:
+            return offset
+        # Only whole events, the last one may still be in the making
+        delta = delta[:delta.rfind(b'\n') + 1]
+        while delta:
+            end = delta.rfind(b'\n', 0, MAX_DELTA) + 1 or \
+                delta.find(b'\n') + 1
+            self.__write('%016d.delta.gz' % offset, delta[:end])
+            offset += end
+            delta = delta[end:]
+            self.__write_atomically(self.queued_file, str(offset).encode())
+        return offset
+
+    def __write(self, name, data):
+        path = os.path.join(self.queue, name)
+        with gzip.open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.rename(path + '.tmp', path)
+
+    def __write_atomically(self, path, data):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.rename(path + '.tmp', path)
+
+    def __send_queue(self):
+        for name in self.__pending():
+            offset, kind = name.split('.')[:2]
+            path = os.path.join(self.queue, name)
+            with open(path, 'rb') as f:
+                body = f.read()
+            try:
+                response = self.session.post(
+                    self.uri,
+                    data=body,
+                    timeout=REQUEST_TIMEOUT,
+                    headers={
+                        'Content-Type': 'application/json'
+                        if kind == 'results' else 'application/x-ndjson',
+                        'Content-Encoding': 'gzip',
+                        'X-Ssgberk-Uuid': self.uuid,
+                        'X-Ssgberk-Timestamp': self.timestamp,
+                        'X-Ssgberk-Kind': kind,
+                        'X-Ssgberk-Offset': str(int(offset))
+                    })
+                response.raise_for_status()
+            except requests.RequestException as e:
+                self.failures += 1
+                backoff = min(MAX_BACKOFF,
+                              INITIAL_BACKOFF * 2**(self.failures - 1))
+                self.retry_at = time.time() + backoff * random.uniform(
+                    0.5, 1.0)
+                log("Error uploading results (attempt %d): %s" %
+                    (self.failures, e))
+                return
+            os.remove(path)
+            self.failures = 0